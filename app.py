@@ -1,9 +1,13 @@
-from flask import Flask, request
+from flask import Flask
 from flask_cors import CORS
 from dotenv import load_dotenv
 import os
 from supabase import create_client
 
+from routes.metrics import init_app as init_metrics, instrument_supabase
+from routes.profiler import init_app as init_profiler
+from routes.http_cache import init_app as init_http_cache
+
 # ---------------------------------
 # Load environment variables
 # ---------------------------------
@@ -15,7 +19,7 @@ load_dotenv()
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+supabase = instrument_supabase(create_client(SUPABASE_URL, SUPABASE_KEY))
 
 # ---------------------------------
 # Import Blueprints (ONLY ONCE)
@@ -32,6 +36,9 @@ from routes.batch import batch_bp
 # ---------------------------------
 app = Flask(__name__)
 CORS(app)
+init_metrics(app)  # /metrics, per-route latency, sampled traces
+init_profiler(app)  # opt-in slow-request profiling
+init_http_cache(app)  # gzip / brotli for large JSON
 
 # ---------------------------------
 # Register Blueprints (ONLY ONCE)
@@ -44,6 +51,13 @@ app.register_blueprint(trace_bp, url_prefix="/api")
 app.register_blueprint(batch_bp, url_prefix="/api")
 from routes.otp import otp_bp
 app.register_blueprint(otp_bp, url_prefix="/api")
+from routes.farm_routing import farm_bp
+app.register_blueprint(farm_bp, url_prefix="/api")
+from routes.batch_scheduler import scheduler_bp, start as start_scheduler
+app.register_blueprint(scheduler_bp, url_prefix="/api")
+start_scheduler()  # AUTO_FINALIZE_ENABLED=1 → background finalize
+from routes.ingest_spool import start as start_spool
+start_spool()  # SPOOL_ENABLED=1 → ingest writes to local WAL first
 
 # ---------------------------------
 # Health Check
@@ -62,51 +76,13 @@ def list_routes():
 # ESP32 → CLOUD INGESTION (UPDATED)
 # ---------------------------------
 
-from datetime import datetime
+from routes.sensors import receive_sensor_data
 
 @app.route("/sensor-data", methods=["POST"])
 def sensor_data():
-    data = request.json
-    print("ESP32 DATA:", data)
-
-    # 🔹 STEP 1: Find ACTIVE batch
-    active_batch = supabase.table("batches") \
-        .select("batch_id") \
-        .eq("status", "ACTIVE") \
-        .limit(1) \
-        .execute()
-
-    if active_batch.data:
-        batch_id = active_batch.data[0]["batch_id"]
-    else:
-        batch_id = "NO_BATCH"
-
-    # 🔹 STEP 2: Build sensor payload
-    sensor_payload = {
-        "airTemp": data.get("temperature"),
-        "humidity": data.get("humidity"),
-        "soilMoisture": data.get("soil_moisture"),
-        "npk": {
-            "N": data.get("nitrogen"),
-            "P": data.get("phosphorus"),
-            "K": data.get("potassium")
-        },
-        "timestamp": datetime.utcnow().isoformat()
-    }
-
-    # 🔹 STEP 3: Insert into harvest_data
-    response = supabase.table("harvest_data").insert({
-        "batch_id": batch_id,
-        "sensor_data": sensor_payload,
-        "merkle_root": "PENDING",
-        "blockchain_tx": "PENDING",
-        "network": "sepolia"
-    }).execute()
-
-    print("ACTIVE BATCH USED:", batch_id)
-    print("SUPABASE RESPONSE:", response)
-
-    return {"status": "stored", "batch_id": batch_id}, 200
+    # Same pipeline as /api/sensors/sensor-data (dedup, anomaly stage,
+    # spool, summaries / rollups, live stream)
+    return receive_sensor_data()
 
 
 
@@ -0,0 +1,265 @@
+"""
+In-process fakes for benchmarking without Supabase / Sepolia.
+
+FakeSupabase implements the subset of the PostgREST query builder this
+repo uses (select/eq/neq/like/gte/lt/order/limit/range/single, insert/update/
+upsert/delete, execute) over in-memory lists of dicts, plus rpc() for
+the SQL functions the routes call (same semantics, in Python).
+
+FakeChain stands in for store_merkle_root_on_chain. When eth-tester is
+installed it signs and mines a real transaction carrying the root on an
+in-memory chain; otherwise it returns a deterministic hash after an
+optional simulated RPC latency.
+"""
+
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import itertools
+import json
+import threading
+import hashlib
+import fnmatch
+import time
+
+
+class _Query:
+    def __init__(self, db, table):
+        self._db = db
+        self._table = table
+        self._filters = []
+        self._order = None
+        self._limit = None
+        self._offset = 0
+        self._single = False
+        self._action = ("select", None)
+
+    # -------- filters / modifiers --------
+    def select(self, *_columns, **_kwargs):
+        self._action = ("select", None)
+        return self
+
+    def eq(self, column, value):
+        self._filters.append(lambda r: r.get(column) == value)
+        return self
+
+    def neq(self, column, value):
+        self._filters.append(lambda r: r.get(column) != value)
+        return self
+
+    def like(self, column, pattern):
+        glob = pattern.replace("%", "*").replace("_", "?")
+        self._filters.append(lambda r: fnmatch.fnmatchcase(str(r.get(column)), glob))
+        return self
+
+    def gte(self, column, value):
+        self._filters.append(lambda r: r.get(column) is not None and r.get(column) >= value)
+        return self
+
+    def lt(self, column, value):
+        self._filters.append(lambda r: r.get(column) is not None and r.get(column) < value)
+        return self
+
+    def in_(self, column, values):
+        values = set(values)
+        self._filters.append(lambda r: r.get(column) in values)
+        return self
+
+    def order(self, column, desc=False):
+        self._order = (column, desc)
+        return self
+
+    def limit(self, n):
+        self._limit = n
+        return self
+
+    def range(self, start, end):
+        self._offset = start
+        self._limit = end - start + 1
+        return self
+
+    def single(self):
+        self._single = True
+        return self
+
+    # -------- writes --------
+    def insert(self, rows, **_kwargs):
+        self._action = ("insert", rows)
+        return self
+
+    def update(self, values):
+        self._action = ("update", values)
+        return self
+
+    def upsert(self, rows, on_conflict="id", ignore_duplicates=False, **_kwargs):
+        self._action = ("upsert", (rows, on_conflict, ignore_duplicates))
+        return self
+
+    def delete(self):
+        self._action = ("delete", None)
+        return self
+
+    # -------- execution --------
+    def _match(self, row):
+        return all(f(row) for f in self._filters)
+
+    def execute(self):
+        if self._db.latency:
+            time.sleep(self._db.latency)
+
+        action, arg = self._action
+        with self._db.lock:
+            rows = self._db.tables.setdefault(self._table, [])
+
+            if action == "insert":
+                data = [self._db.stamp(dict(r)) for r in (arg if isinstance(arg, list) else [arg])]
+                rows.extend(data)
+                return SimpleNamespace(data=data)
+
+            if action == "upsert":
+                new_rows, on_conflict, ignore_duplicates = arg
+                keys = [k.strip() for k in on_conflict.split(",")]
+                index = {tuple(r.get(k) for k in keys): r for r in rows}
+                data = []
+                for r in (new_rows if isinstance(new_rows, list) else [new_rows]):
+                    key = tuple(r.get(k) for k in keys)
+                    # NULLs never conflict on a unique index
+                    existing = None if None in key else index.get(key)
+                    if existing is None:
+                        stored = self._db.stamp(dict(r))
+                        rows.append(stored)
+                        index[key] = stored
+                        data.append(stored)
+                    elif not ignore_duplicates:
+                        existing.update(r)
+                        data.append(existing)
+                return SimpleNamespace(data=data)
+
+            matched = [r for r in rows if self._match(r)]
+
+            if action == "update":
+                for r in matched:
+                    r.update(arg)
+                return SimpleNamespace(data=matched)
+
+            if action == "delete":
+                self._db.tables[self._table] = [r for r in rows if not self._match(r)]
+                return SimpleNamespace(data=matched)
+
+            if self._order:
+                column, desc = self._order
+                matched = sorted(matched, key=lambda r: (r.get(column) is None, r.get(column)), reverse=desc)
+            if self._limit is not None:
+                matched = matched[self._offset:self._offset + self._limit]
+
+            data = [dict(r) for r in matched]
+            if self._single:
+                return SimpleNamespace(data=data[0] if data else None)
+            return SimpleNamespace(data=data)
+
+
+class FakeSupabase:
+    def __init__(self, latency_ms=0.0):
+        self.tables = {}
+        self.lock = threading.RLock()
+        self.latency = latency_ms / 1000.0
+        self._ids = itertools.count(1)
+        self._epoch = datetime(2026, 1, 1)
+
+    def stamp(self, row):
+        n = next(self._ids)
+        row.setdefault("id", n)
+        # Strictly increasing created_at, like a real insert order
+        row.setdefault("created_at", (self._epoch + timedelta(microseconds=n)).isoformat())
+        return row
+
+    def table(self, name):
+        return _Query(self, name)
+
+    from_ = table
+
+    def rpc(self, fn, params=None):
+        def execute():
+            if self.latency:
+                time.sleep(self.latency)
+            with self.lock:
+                return SimpleNamespace(data=getattr(self, "_rpc_" + fn)(**(params or {})))
+        return SimpleNamespace(execute=execute)
+
+    # -------- SQL functions --------
+    def _rpc_merge_batch_summary(self, p_batch_id, p_count, p_stats):
+        from routes.metric_stats import merge_stats
+
+        rows = self.tables.setdefault("batch_summaries", [])
+        row = next((r for r in rows if r["batch_id"] == p_batch_id), None)
+        if row is None:
+            row = {"batch_id": p_batch_id, "reading_count": 0, "stats": {}}
+            rows.append(row)
+
+        row["reading_count"] += p_count
+        merge_stats(row["stats"], json.loads(json.dumps(p_stats)))
+        return row["reading_count"]
+
+    def _rpc_merge_sensor_rollups(self, p_batch_id, p_rows):
+        from routes.metric_stats import merge_stats
+
+        rows = self.tables.setdefault("sensor_rollups", [])
+        index = {(r["batch_id"], r["resolution"], r["bucket_start"]): r for r in rows}
+        for delta in json.loads(json.dumps(p_rows)):
+            row = index.get((p_batch_id, delta["resolution"], delta["bucket_start"]))
+            if row is None:
+                rows.append(dict(delta, batch_id=p_batch_id))
+                continue
+            row["reading_count"] += delta["reading_count"]
+            merge_stats(row["stats"], delta["stats"])
+        return None
+
+    def _rpc_replace_sensor_rollups(self, p_batch_id, p_rows):
+        rows = [r for r in self.tables.get("sensor_rollups", []) if r["batch_id"] != p_batch_id]
+        rows.extend(dict(r, batch_id=p_batch_id) for r in json.loads(json.dumps(p_rows)))
+        self.tables["sensor_rollups"] = rows
+        return None
+
+
+class FakeChain:
+    def __init__(self, latency_ms=0.0):
+        self.latency = latency_ms / 1000.0
+        self.tx_count = 0
+        self._tester = None
+
+        try:
+            from web3 import Web3, EthereumTesterProvider
+            w3 = Web3(EthereumTesterProvider())
+            self._tester = (w3, w3.eth.accounts[0])
+            self.backend = "eth-tester"
+        except Exception:
+            self.backend = "simulated"
+
+    def store_merkle_root_on_chain(self, batch_id: str, merkle_root_hex: str) -> str:
+        self.tx_count += 1
+
+        if self._tester:
+            w3, account = self._tester
+            tx_hash = w3.eth.send_transaction({
+                "from": account,
+                "to": account,
+                "value": 0,
+                "data": "0x" + merkle_root_hex.replace("0x", "")
+            })
+            receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
+            return "0x" + receipt.transactionHash.hex().replace("0x", "")
+
+        if self.latency:
+            time.sleep(self.latency)
+        return "0x" + hashlib.sha256(f"{batch_id}:{merkle_root_hex}".encode()).hexdigest()
+
+
+class FakeContract:
+    """
+    Read-only contract stub for trace (getTotalBatches().call()).
+    """
+
+    def __init__(self, chain: FakeChain):
+        self._chain = chain
+        self.functions = SimpleNamespace(
+            getTotalBatches=lambda: SimpleNamespace(call=lambda: self._chain.tx_count)
+        )
@@ -0,0 +1,88 @@
+"""
+Closed-loop HTTP load generator for comparing serving modes.
+
+    SERVER_MODE=sync   gunicorn -c gunicorn.conf.py app:app
+    python -m bench.http_load http://localhost:5000/api/trace/BATCH_1 -c 200 -n 5000
+
+    SERVER_MODE=gevent gunicorn -c gunicorn.conf.py app:app
+    python -m bench.http_load http://localhost:5000/api/trace/BATCH_1 -c 200 -n 5000
+
+Prints one JSON line with throughput, latency percentiles and error count.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import urllib.request
+import argparse
+import json
+import time
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _one_request(url, method, body, timeout):
+    start = time.perf_counter()
+    try:
+        req = urllib.request.Request(url, data=body, method=method, headers={
+            "Content-Type": "application/json"
+        })
+        with urllib.request.urlopen(req, timeout=timeout) as res:
+            res.read()
+            ok = res.status < 500
+    except urllib.error.HTTPError as e:
+        ok = e.code < 500
+    except Exception:
+        ok = False
+    return time.perf_counter() - start, ok
+
+
+def run(url, concurrency=50, requests=1000, method="GET", body=None, timeout=30):
+    payload = json.dumps(body).encode() if body is not None else None
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(
+            lambda _: _one_request(url, method, payload, timeout),
+            range(requests)
+        ))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(r[0] * 1000 for r in results)
+    errors = sum(1 for r in results if not r[1])
+
+    return {
+        "url": url,
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 1),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 2),
+            "p95": round(percentile(latencies, 95), 2),
+            "p99": round(percentile(latencies, 99), 2),
+            "max": round(latencies[-1], 2)
+        }
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HTTP load test")
+    parser.add_argument("url")
+    parser.add_argument("-c", "--concurrency", type=int, default=50)
+    parser.add_argument("-n", "--requests", type=int, default=1000)
+    parser.add_argument("-X", "--method", default="GET")
+    parser.add_argument("-d", "--data", help="JSON request body")
+    args = parser.parse_args()
+
+    print(json.dumps(run(
+        args.url,
+        concurrency=args.concurrency,
+        requests=args.requests,
+        method=args.method,
+        body=json.loads(args.data) if args.data else None
+    )))
@@ -0,0 +1,365 @@
+"""
+Benchmark harness for the hot paths, fully in-process.
+
+    python -m bench.run                          # everything, JSON to stdout
+    python -m bench.run --only micro,finalize --out bench.json
+    python -m bench.run --compare previous.json  # adds new/old ratios
+
+Supabase is replaced by bench.fakes.FakeSupabase and the chain by
+bench.fakes.FakeChain before any route module is imported, so the real
+blueprints run unchanged against in-memory state.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import subprocess
+import statistics
+import platform
+import argparse
+import tempfile
+import random
+import json
+import time
+import sys
+import os
+
+from bench.fakes import FakeSupabase, FakeChain, FakeContract
+from bench.http_load import percentile
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# =========================================================
+# Environment: patch external services, import the app
+# =========================================================
+def setup(db_latency_ms=0.0, rpc_latency_ms=0.0):
+    os.chdir(BASE_DIR)  # routes open abi.json relative to cwd
+    sys.path.insert(0, BASE_DIR)
+
+    os.environ.setdefault("ARCHIVE_DIR", tempfile.mkdtemp(prefix="agrichain-bench-"))
+    os.environ.setdefault("OTP_STORE", "memory")
+    os.environ.setdefault("SPOOL_DIR", tempfile.mkdtemp(prefix="agrichain-spool-"))
+    os.environ.setdefault("VERIFY_CACHE_DIR", tempfile.mkdtemp(prefix="agrichain-verify-"))
+    # routes.otp builds a Twilio client at import; no SMS is ever sent
+    os.environ.setdefault("TWILIO_SID", "AC" + "0" * 32)
+    os.environ.setdefault("TWILIO_AUTH", "bench")
+    os.environ.setdefault("TWILIO_PHONE", "+10000000000")
+
+    import supabase as supabase_pkg
+
+    db = FakeSupabase(latency_ms=db_latency_ms)
+    supabase_pkg.create_client = lambda *args, **kwargs: db
+
+    chain = FakeChain(latency_ms=rpc_latency_ms)
+
+    from app import app
+    import routes.blockchain
+    import routes.trace
+
+    routes.blockchain.store_merkle_root_on_chain = chain.store_merkle_root_on_chain
+    routes.trace.contract = FakeContract(chain)
+
+    return app, db, chain
+
+
+def _reading(device=0):
+    return {
+        "device_id": f"ESP32_{device:04d}",
+        "temperature": round(random.uniform(25, 35), 2),
+        "humidity": round(random.uniform(50, 80), 2),
+        "soil_moisture": round(random.uniform(25, 45), 2),
+        "soilPH": round(random.uniform(6.0, 7.0), 2),
+        "nitrogen": random.randint(10, 60),
+        "phosphorus": random.randint(5, 40),
+        "potassium": random.randint(10, 50)
+    }
+
+
+def _seed_batch(db, batch_id, n, status="ACTIVE"):
+    db.table("batches").insert({
+        "batch_id": batch_id,
+        "crop": "Bench",
+        "location": "Bench",
+        "start_date": datetime.utcnow().isoformat(),
+        "status": status
+    }).execute()
+
+    rows = []
+    for i in range(n):
+        r = _reading(i % 50)
+        rows.append({
+            "batch_id": batch_id,
+            "sensor_data": {
+                "airTemp": r["temperature"],
+                "humidity": r["humidity"],
+                "soilMoisture": r["soil_moisture"],
+                "npk": {"N": r["nitrogen"], "P": r["phosphorus"], "K": r["potassium"]},
+                "soilPH": r["soilPH"],
+                "timestamp": datetime.utcnow().isoformat()
+            },
+            "merkle_root": "PENDING",
+            "blockchain_tx": "PENDING",
+            "network": "sepolia"
+        })
+    db.table("harvest_data").insert(rows).execute()
+
+
+def _timeit(fn, number, repeat=5):
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        runs.append((time.perf_counter() - start) / number)
+    return {
+        "per_op_us": round(min(runs) * 1e6, 3),
+        "median_us": round(statistics.median(runs) * 1e6, 3),
+        "ops": number * repeat
+    }
+
+
+def _latency_summary(latencies, errors, elapsed):
+    latencies = sorted(l * 1000 for l in latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "p50_ms": round(percentile(latencies, 50), 3) if latencies else None,
+        "p95_ms": round(percentile(latencies, 95), 3) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99), 3) if latencies else None
+    }
+
+
+# =========================================================
+# Micro benchmarks
+# =========================================================
+def bench_micro(app, db, chain):
+    from routes.hash_readings import hash_reading
+    from routes.merkle_tree import merkle_root
+    from routes.predict import crop_health_model, disease_model
+    import pandas as pd
+
+    reading = {
+        "airTemp": 29.4, "humidity": 63.1, "soilMoisture": 33.0,
+        "npk": {"N": 40, "P": 22, "K": 31}, "soilPH": 6.6,
+        "timestamp": "2026-01-01T00:00:00.000000"
+    }
+    leaves = [hash_reading({**reading, "seq": i}) for i in range(10000)]
+    features = pd.DataFrame([{
+        "temperature": 29.4, "humidity": 63.1, "soilMoisture": 33.0, "ph": 6.6,
+        "nitrogen": 40.0, "phosphorus": 22.0, "potassium": 31.0
+    }])
+
+    return {
+        "hash_reading": _timeit(lambda: hash_reading(reading), 5000),
+        "merkle_root_1k": _timeit(lambda: merkle_root(leaves[:1000]), 20),
+        "merkle_root_10k": _timeit(lambda: merkle_root(leaves), 3),
+        "crop_health_predict": _timeit(lambda: crop_health_model.predict(features), 50),
+        "disease_predict": _timeit(lambda: disease_model.predict(features), 50)
+    }
+
+
+# =========================================================
+# Macro: N devices x M readings/sec ingest
+# =========================================================
+def bench_ingest(app, db, chain, devices=20, rate=5.0, duration=5.0):
+    app.test_client().post("/api/batch/create", json={"crop": "Bench", "location": "Bench"})
+
+    def device_loop(device):
+        client = app.test_client()
+        latencies, errors = [], 0
+        interval = 1.0 / rate
+        deadline = time.perf_counter() + duration
+        next_send = time.perf_counter() + random.uniform(0, interval)
+
+        while next_send < deadline:
+            time.sleep(max(0.0, next_send - time.perf_counter()))
+            start = time.perf_counter()
+            res = client.post("/api/sensors/sensor-data", json=_reading(device))
+            latencies.append(time.perf_counter() - start)
+            errors += res.status_code >= 400
+            next_send += interval
+
+        return latencies, errors
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=devices) as pool:
+        results = list(pool.map(device_loop, range(devices)))
+    elapsed = time.perf_counter() - started
+
+    summary = _latency_summary(
+        [l for r in results for l in r[0]],
+        sum(r[1] for r in results),
+        elapsed
+    )
+    summary["target_rps"] = devices * rate
+    return summary
+
+
+# =========================================================
+# Macro: large-batch finalize
+# =========================================================
+def bench_finalize(app, db, chain, sizes=(1000, 10000)):
+    from routes.batch import _finalize_batch_with_blockchain
+
+    results = {}
+    for size in sizes:
+        batch_id = f"BENCH_FINALIZE_{size}"
+        _seed_batch(db, batch_id, size)
+
+        start = time.perf_counter()
+        _finalize_batch_with_blockchain(batch_id)
+        results[str(size)] = {"elapsed_ms": round((time.perf_counter() - start) * 1000, 3)}
+
+    results["chain_backend"] = chain.backend
+    return results
+
+
+# =========================================================
+# Macro: QR-scan storm on one finalized batch
+# =========================================================
+def bench_trace(app, db, chain, readings=2000, concurrency=16, requests=400):
+    from routes.batch import _finalize_batch_with_blockchain
+
+    batch_id = "BENCH_TRACE"
+    _seed_batch(db, batch_id, readings)
+    _finalize_batch_with_blockchain(batch_id)
+
+    def scan(_):
+        client = app.test_client()
+        start = time.perf_counter()
+        res = client.get(f"/api/trace/{batch_id}")
+        return time.perf_counter() - start, res.status_code != 200
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(scan, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    summary = _latency_summary([r[0] for r in results], sum(r[1] for r in results), elapsed)
+    summary["batch_readings"] = readings
+    return summary
+
+
+# =========================================================
+# Micro: anomaly detection cost per reading (budget: 50µs)
+# =========================================================
+def bench_anomaly(app, db, chain, devices=1000, readings_per_device=50):
+    from routes.anomaly import AnomalyDetector
+    from routes.reading import Reading
+    from routes.sensor_simulation import VirtualDevice
+
+    fleet = [VirtualDevice(f"ESP32_{i:05d}", random.Random(i)) for i in range(devices)]
+    stream = [
+        (device.device_id, Reading.from_payload(device.next_reading()).to_dict())
+        for _ in range(readings_per_device)
+        for device in fleet
+    ]
+
+    runs = []
+    for _ in range(5):
+        detector = AnomalyDetector(max_devices=devices)
+        flagged = 0
+        start = time.perf_counter()
+        for device_id, reading in stream:
+            # Score, then learn: what ingest does for an accepted reading
+            flagged += bool(detector.inspect(device_id, reading))
+            detector.observe(device_id, [reading])
+        runs.append((time.perf_counter() - start) / len(stream))
+
+    per_reading_us = round(min(runs) * 1e6, 3)
+    return {
+        "per_op_us": per_reading_us,
+        "median_us": round(statistics.median(runs) * 1e6, 3),
+        "readings": len(stream) * len(runs),
+        "devices": devices,
+        "flag_rate": round(flagged / len(stream), 5),
+        "budget_us": 50,
+        "within_budget": per_reading_us < 50
+    }
+
+
+SCENARIOS = {
+    "micro": bench_micro,
+    "anomaly": bench_anomaly,
+    "ingest": bench_ingest,
+    "finalize": bench_finalize,
+    "trace": bench_trace
+}
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+def compare(current, previous):
+    """
+    new/old ratio for every latency-like figure present in both runs.
+    """
+
+    ratios = {}
+
+    def walk(new, old, path):
+        for key, value in new.items():
+            if key not in old:
+                continue
+            if isinstance(value, dict) and isinstance(old[key], dict):
+                walk(value, old[key], path + [key])
+            elif key in ("per_op_us", "p50_ms", "p95_ms", "p99_ms", "elapsed_ms") \
+                    and value and old[key]:
+                ratios[".".join(path + [key])] = round(value / old[key], 3)
+
+    walk(current["results"], previous["results"], [])
+    return ratios
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="AgriChain benchmark suite")
+    parser.add_argument("--only", default=",".join(SCENARIOS))
+    parser.add_argument("--out", help="write JSON results to this file")
+    parser.add_argument("--compare", help="previous JSON results to compare against")
+    parser.add_argument("--db-latency-ms", type=float, default=0.0)
+    parser.add_argument("--rpc-latency-ms", type=float, default=0.0)
+    parser.add_argument("--devices", type=int, default=20)
+    parser.add_argument("--rate", type=float, default=5.0, help="readings/sec per device")
+    parser.add_argument("--duration", type=float, default=5.0)
+    args = parser.parse_args()
+
+    random.seed(42)
+    app, db, chain = setup(args.db_latency_ms, args.rpc_latency_ms)
+
+    results = {}
+    for name in args.only.split(","):
+        print("⏱️ Running:", name, file=sys.stderr)
+        if name == "ingest":
+            results[name] = bench_ingest(app, db, chain, args.devices, args.rate, args.duration)
+        else:
+            results[name] = SCENARIOS[name](app, db, chain)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "db_latency_ms": args.db_latency_ms,
+            "rpc_latency_ms": args.rpc_latency_ms
+        },
+        "results": results
+    }
+
+    if args.compare:
+        with open(args.compare) as f:
+            report["ratios"] = compare(report, json.load(f))
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output)
+    print(output)
@@ -0,0 +1,25 @@
+"""
+WSGI entry point on the in-memory fakes, for HTTP load tests of the
+serving modes without Supabase / Sepolia:
+
+    BENCH_DB_LATENCY_MS=20 SERVER_MODE=gevent \
+        gunicorn -c gunicorn.conf.py bench.serve:app
+    python -m bench.http_load http://localhost:5000/api/trace/BENCH_HTTP -c 200 -n 5000
+
+Every worker seeds and finalizes BENCH_HTTP (BENCH_READINGS readings).
+"""
+
+import os
+
+from bench.run import setup, _seed_batch
+
+app, db, chain = setup(
+    float(os.getenv("BENCH_DB_LATENCY_MS", "0")),
+    float(os.getenv("BENCH_RPC_LATENCY_MS", "0"))
+)
+
+_seed_batch(db, "BENCH_HTTP", int(os.getenv("BENCH_READINGS", "2000")))
+
+from routes.batch import _finalize_batch_with_blockchain  # noqa: E402
+
+_finalize_batch_with_blockchain("BENCH_HTTP")
@@ -0,0 +1,39 @@
+"""
+Gunicorn configuration.
+
+    gunicorn -c gunicorn.conf.py app:app
+
+SERVER_MODE=gthread (default): WEB_CONCURRENCY processes x GUNICORN_THREADS
+threads. Blocking Supabase / RPC / Twilio calls release the GIL, CPU work
+(Merkle finalize, model predict) runs in parallel across processes, and
+the spool's fsyncs block only their own thread.
+
+SERVER_MODE=gevent (opt-in): cooperative greenlets, hundreds of in-flight
+I/O-bound requests (and SSE streams) per process. Blocking / CPU-bound
+calls are pushed to gevent's OS-thread pool (routes/offload.py) so they
+do not stall the hub. SERVER_MODE=sync: one request per worker process.
+
+Measured with bench/serve.py (fakes, 20 ms per DB call, 1 CPU): gevent
+681 rps / gthread 554 rps / sync 135 rps on cached trace scans, all ~28 rps
+on CPU-bound ?reverify=1; see README.md "Serving modes".
+"""
+
+import multiprocessing
+import os
+
+SERVER_MODE = os.getenv("SERVER_MODE", "gthread")
+
+bind = os.getenv("BIND", "0.0.0.0:" + os.getenv("PORT", "5000"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+
+if SERVER_MODE == "gevent":
+    worker_class = "gevent"
+    workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+    worker_connections = int(os.getenv("WORKER_CONNECTIONS", "1000"))
+elif SERVER_MODE == "sync":
+    worker_class = "sync"
+    workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count() * 2 + 1)))
+else:
+    worker_class = "gthread"
+    workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count() * 2 + 1)))
+    threads = int(os.getenv("GUNICORN_THREADS", "8"))
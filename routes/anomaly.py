@@ -0,0 +1,290 @@
+"""
+Streaming sensor-fault detection for the ingest pipeline.
+
+Each device keeps one fixed-size NumPy ring buffer (window x metric),
+so all seven metrics are checked with a handful of vectorized ops:
+
+- range:  value outside the sensor's physical range
+- spike:  robust z-score |x - median| / (1.4826 * MAD) above ANOMALY_Z
+- stuck:  the same value repeated ANOMALY_STUCK_RUN times (flatline)
+
+- invalid: a metric sent as NaN / Infinity (a missing metric is not
+  flagged; it carries the last value)
+
+Median / MAD are refreshed every ANOMALY_REFRESH readings (partition,
+not sort) and the current value is scored against the previous
+baseline, so a spike never hides itself. Devices are held in an LRU
+capped at ANOMALY_MAX_DEVICES (~4 KB each with the default window).
+
+Scoring and learning are separate: inspect() never changes a window,
+observe() adds readings once ingest has accepted them, so retries,
+duplicates and readings rejected for their batch do not skew the
+baseline or the flatline count.
+
+ANOMALY_MODE:
+    off         no checks
+    flag        store as usual, with the findings in harvest_data.anomalies
+    quarantine  divert flagged readings to quarantined_readings
+
+    alter table harvest_data add column anomalies jsonb;
+
+    create table quarantined_readings (
+        id          bigserial primary key,
+        batch_id    text,
+        device_id   text,
+        sensor_data jsonb not null,
+        anomalies   jsonb not null,
+        created_at  timestamptz default now()
+    );
+"""
+
+from collections import OrderedDict
+import threading
+import os
+
+import numpy as np
+
+from routes.metric_stats import METRICS
+from routes.metrics import gauge
+
+ANOMALY_MODE = os.getenv("ANOMALY_MODE", "flag")
+ANOMALY_WINDOW = int(os.getenv("ANOMALY_WINDOW", "64"))
+ANOMALY_MIN_HISTORY = int(os.getenv("ANOMALY_MIN_HISTORY", "16"))
+ANOMALY_Z = float(os.getenv("ANOMALY_Z", "6.0"))
+ANOMALY_STUCK_RUN = int(os.getenv("ANOMALY_STUCK_RUN", "50"))
+ANOMALY_REFRESH = int(os.getenv("ANOMALY_REFRESH", "4"))
+ANOMALY_MAX_DEVICES = int(os.getenv("ANOMALY_MAX_DEVICES", "10000"))
+
+# Physical sensor limits, in METRICS order
+RANGE_LOW = np.array([-20.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0])
+RANGE_HIGH = np.array([70.0, 100.0, 100.0, 14.0, 2000.0, 2000.0, 2000.0])
+
+# Smallest spread treated as noise, so a quiet sensor's tiny MAD does
+# not turn ordinary jitter into spikes (°C, %, %, pH, mg/kg x3)
+MIN_SCALE = np.array([0.5, 1.0, 1.0, 0.05, 2.0, 2.0, 2.0])
+
+_MEDIAN_INDEX = ANOMALY_WINDOW // 2
+
+stats = {"inspected": 0, "flagged": 0, "quarantined": 0}
+
+
+_NONE = np.zeros(len(METRICS), dtype=bool)
+
+
+def _vector(reading: dict):
+    """
+    (values, present, invalid): missing metrics are NaN and not
+    present; NaN / Infinity sent by the device are invalid.
+    """
+
+    npk = reading.get("npk") or {}
+    values = (
+        reading.get("airTemp"), reading.get("humidity"),
+        reading.get("soilMoisture"), reading.get("soilPH"),
+        npk.get("N"), npk.get("P"), npk.get("K")
+    )
+    x = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    present = np.isfinite(x)
+    if present.all():
+        return x, present, _NONE
+    invalid = ~present & np.array([v is not None for v in values])
+    return x, present, invalid
+
+
+def _findings(x, invalid, out_of_range, spike, stuck, score, median) -> list:
+    findings = [] if invalid is _NONE else [
+        {"metric": METRICS[i], "check": "invalid", "value": None}
+        for i in np.flatnonzero(invalid)
+    ]
+
+    bad = out_of_range | spike | stuck
+    if not bad.any():
+        return findings
+
+    for i in np.flatnonzero(bad):
+        check = "range" if out_of_range[i] else "stuck" if stuck[i] else "spike"
+        finding = {"metric": METRICS[i], "check": check, "value": float(x[i])}
+        if check == "spike":
+            finding["median"] = float(median[i])
+            finding["score"] = round(float(score[i]), 2)
+        findings.append(finding)
+    return findings
+
+
+class _Window:
+    __slots__ = ("buf", "pos", "count", "last", "run", "median", "scale")
+
+    def __init__(self):
+        self.buf = np.full((ANOMALY_WINDOW, len(METRICS)), np.nan)
+        self.pos = 0
+        self.count = 0
+        self.last = np.full(len(METRICS), np.nan)
+        self.run = np.zeros(len(METRICS), dtype=np.int64)
+        self.median = None
+        self.scale = None
+
+    def _refresh(self):
+        history = self.buf if self.count >= ANOMALY_WINDOW else self.buf[:self.count]
+        middle = min(_MEDIAN_INDEX, len(history) // 2)
+        median = np.partition(history, middle, axis=0)[middle]
+        mad = np.partition(np.abs(history - median), middle, axis=0)[middle]
+        self.median = median
+        self.scale = np.maximum(mad * 1.4826, MIN_SCALE)
+
+    def copy(self):
+        # Only buf is updated in place; the rest is replaced on push
+        window = _Window.__new__(_Window)
+        window.buf = self.buf.copy()
+        window.pos, window.count = self.pos, self.count
+        window.last, window.run = self.last, self.run
+        window.median, window.scale = self.median, self.scale
+        return window
+
+    def check(self, x, present):
+        """
+        Score x against the current baseline without adding it.
+        Returns (range, spike, stuck, score) boolean / float vectors.
+        """
+
+        out_of_range = present & ((x < RANGE_LOW) | (x > RANGE_HIGH))
+
+        if self.median is not None:
+            score = np.abs(x - self.median) / self.scale
+            spike = present & (score > ANOMALY_Z)
+        else:
+            score = np.zeros(len(METRICS))
+            spike = _NONE
+
+        run = np.where(present & (x == self.last), self.run + 1, 0)
+        stuck = run >= ANOMALY_STUCK_RUN
+
+        return out_of_range, spike, stuck, score
+
+    def push(self, x, present):
+        self.run = np.where(present & (x == self.last), self.run + 1, 0)
+
+        # Missing / invalid metrics carry the last value so the window
+        # stays dense (and finite)
+        x = np.where(present, x, self.last)
+        self.buf[self.pos] = x
+        self.last = x
+        self.pos = (self.pos + 1) % ANOMALY_WINDOW
+        self.count += 1
+
+        if self.count >= ANOMALY_MIN_HISTORY and self.count % ANOMALY_REFRESH == 0:
+            self._refresh()
+
+
+class AnomalyDetector:
+    def __init__(self, max_devices=ANOMALY_MAX_DEVICES):
+        self.max_devices = max_devices
+        self._windows = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._windows)
+
+    def inspect(self, device_id, reading: dict) -> list:
+        """
+        Findings for this reading ([] when clean); the window is not
+        changed. Without a device_id only the range and invalid checks
+        apply.
+        """
+
+        x, present, invalid = _vector(reading)
+
+        window = self._windows.get(device_id) if device_id else None
+        if window is None:
+            out_of_range = present & ((x < RANGE_LOW) | (x > RANGE_HIGH))
+            return _findings(x, invalid, out_of_range, _NONE, _NONE, None, None)
+
+        with self._lock:
+            out_of_range, spike, stuck, score = window.check(x, present)
+            median = window.median
+
+        return _findings(x, invalid, out_of_range, spike, stuck, score, median)
+
+    def inspect_many(self, device_id, readings) -> list:
+        """
+        Findings per reading for one device's readings in order, each
+        scored as if the earlier ones were accepted (on a scratch copy).
+        """
+
+        if not device_id:
+            return [self.inspect(None, reading) for reading in readings]
+
+        with self._lock:
+            window = self._windows.get(device_id)
+            scratch = window.copy() if window is not None else _Window()
+
+        results = []
+        for reading in readings:
+            x, present, invalid = _vector(reading)
+            out_of_range, spike, stuck, score = scratch.check(x, present)
+            results.append(_findings(x, invalid, out_of_range, spike, stuck, score, scratch.median))
+            scratch.push(x, present)
+        return results
+
+    def observe(self, device_id, readings) -> None:
+        """
+        Add accepted readings to the device's window, in order.
+        """
+
+        if not device_id or not readings:
+            return
+
+        vectors = [_vector(reading) for reading in readings]
+
+        with self._lock:
+            window = self._windows.get(device_id)
+            if window is None:
+                window = self._windows[device_id] = _Window()
+                if len(self._windows) > self.max_devices:
+                    self._windows.popitem(last=False)
+            else:
+                self._windows.move_to_end(device_id)
+
+            for x, present, _ in vectors:
+                window.push(x, present)
+
+
+detector = AnomalyDetector()
+
+gauge("anomaly_devices_tracked", "Devices with a detection window", lambda: len(detector))
+gauge("anomaly_flagged_total", "Readings with at least one finding", lambda: stats["flagged"])
+gauge("anomaly_quarantined_total", "Readings diverted to quarantine", lambda: stats["quarantined"])
+
+
+def inspect(device_id, reading: dict) -> list:
+    if ANOMALY_MODE == "off":
+        return []
+
+    findings = detector.inspect(device_id, reading)
+    stats["inspected"] += 1
+    if findings:
+        stats["flagged"] += 1
+    return findings
+
+
+def inspect_many(device_id, readings) -> list:
+    if ANOMALY_MODE == "off":
+        return [[] for _ in readings]
+
+    results = detector.inspect_many(device_id, readings)
+    stats["inspected"] += len(results)
+    stats["flagged"] += sum(1 for findings in results if findings)
+    return results
+
+
+def observe(device_id, readings) -> None:
+    """
+    Call once ingest has accepted the readings (stored, spooled or
+    quarantined), never for duplicates or rejected rows.
+    """
+
+    if ANOMALY_MODE != "off":
+        detector.observe(device_id, readings)
+
+
+def should_quarantine(findings) -> bool:
+    return bool(findings) and ANOMALY_MODE == "quarantine"
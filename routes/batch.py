@@ -4,6 +4,11 @@ import time
 from supabase import create_client
 import os
 
+from routes.metrics import instrument_supabase, MERKLE_LATENCY, size_bucket
+from routes.farm_routing import DEFAULT_FARM, partition_lock, invalidate_farm, invalidate_batch
+from routes.paging import fetch_all, readings_of
+from routes.live_stream import hub
+
 # ================================
 # Blueprint
 # ================================
@@ -14,7 +19,7 @@ batch_bp = Blueprint("batch_routes", __name__)
 # ================================
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+supabase = instrument_supabase(create_client(SUPABASE_URL, SUPABASE_KEY))
 
 # ================================
 # In-memory active batch (UI helper)
@@ -22,6 +27,34 @@ supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
 current_batch = None
 
 
+# =========================================================
+# INTERNAL: Start a new ACTIVE batch for one farm
+# =========================================================
+def _create_batch(farm_id, crop=None, location=None):
+    # Close this farm's ACTIVE batch only; other farms keep theirs
+    supabase.table("batches").update({
+        "status": "COMPLETED",
+        "end_date": datetime.utcnow().isoformat()
+    }).eq("status", "ACTIVE").eq("farm_id", farm_id).execute()
+
+    if farm_id == DEFAULT_FARM:
+        batch_id = f"BATCH_{int(time.time())}"
+    else:
+        batch_id = f"BATCH_{farm_id}_{int(time.time())}"
+
+    supabase.table("batches").insert({
+        "batch_id": batch_id,
+        "farm_id": farm_id,
+        "crop": crop or "Unknown Crop",
+        "location": location or "Unknown Location",
+        "start_date": datetime.utcnow().isoformat(),
+        "status": "ACTIVE"
+    }).execute()
+
+    invalidate_farm(farm_id)
+    return batch_id
+
+
 # =========================================================
 # POST: Create New Batch
 # =========================================================
@@ -31,28 +64,16 @@ def create_batch():
     print("✅ /batch/create called")
 
     data = request.get_json(silent=True) or {}
+    farm_id = data.get("farm_id") or DEFAULT_FARM
 
     try:
-        # Close any ACTIVE batch in DB
-        supabase.table("batches").update({
-            "status": "COMPLETED",
-            "end_date": datetime.utcnow().isoformat()
-        }).eq("status", "ACTIVE").execute()
-
-        batch_id = f"BATCH_{int(time.time())}"
+        batch_id = _create_batch(farm_id, data.get("crop"), data.get("location"))
         current_batch = batch_id  # UI helper only
 
-        supabase.table("batches").insert({
-            "batch_id": batch_id,
-            "crop": data.get("crop", "Unknown Crop"),
-            "location": data.get("location", "Unknown Location"),
-            "start_date": datetime.utcnow().isoformat(),
-            "status": "ACTIVE"
-        }).execute()
-
         return jsonify({
             "message": "New batch created successfully",
-            "batch_id": batch_id
+            "batch_id": batch_id,
+            "farm_id": farm_id
         }), 200
 
     except Exception as e:
@@ -63,7 +84,7 @@ def create_batch():
 
 
 # =========================================================
-# GET: Current Active Batch
+# GET: Current Active Batch (?farm_id=, default farm otherwise)
 # =========================================================
 @batch_bp.route("/batch/current", methods=["GET"])
 def get_current_batch():
@@ -71,6 +92,7 @@ def get_current_batch():
         res = supabase.table("batches") \
             .select("batch_id") \
             .eq("status", "ACTIVE") \
+            .eq("farm_id", request.args.get("farm_id") or DEFAULT_FARM) \
             .order("start_date", desc=True) \
             .limit(1) \
             .execute()
@@ -90,7 +112,7 @@ def get_current_batch():
 def get_all_batches():
     try:
         response = supabase.table("batches") \
-            .select("batch_id, crop, location, status, start_date") \
+            .select("batch_id, farm_id, crop, location, status, start_date") \
             .order("start_date", desc=True) \
             .execute()
 
@@ -123,52 +145,119 @@ def get_finalized_batches():
         }), 500
 
 
+class BatchNotActive(Exception):
+    pass
+
+
+class NoReadings(Exception):
+    pass
+
+
+class AnchoredNotRecorded(Exception):
+    """
+    The root is on chain but the batch row could not be marked
+    FINALIZED. The batch stays FINALIZING: a retry would anchor twice.
+    """
+
+    def __init__(self, batch_id, root, tx_hash, error):
+        super().__init__(f"Batch {batch_id} anchored (tx {tx_hash}) but not recorded: {error}")
+        self.root = root
+        self.tx_hash = tx_hash
+
+
 # =========================================================
 # INTERNAL: Finalize Batch (Merkle + Blockchain)
 # =========================================================
 def _finalize_batch_with_blockchain(batch_id):
-    from routes.hash_readings import hash_reading
-    from routes.merkle_tree import merkle_root
-    from routes.blockchain import store_merkle_root_on_chain
+    from routes.ingest_spool import wait_drained
+
+    # Readings still in the local ingest spool must be in the table first
+    wait_drained(batch_id)
+
+    # Claim: only one finalize across all processes gets the row, and
+    # from here harvest_data rejects new rows for this batch
+    claimed = supabase.table("batches").update({
+        "status": "FINALIZING"
+    }).eq("batch_id", batch_id).eq("status", "ACTIVE").execute()
+
+    if not claimed.data:
+        raise BatchNotActive(f"Batch {batch_id} is not active")
+
+    invalidate_batch(batch_id)
+
+    try:
+        return _anchor_batch(batch_id)
+    except AnchoredNotRecorded as e:
+        # Never give it back: the chain already has it. Record
+        # e.tx_hash / e.root on the batch by hand
+        print("🚨 Finalize half done, batch left FINALIZING:", e)
+        raise
+    except Exception:
+        # Nothing on chain yet: give the batch back (a crash here
+        # leaves it FINALIZING; reset it to ACTIVE by hand)
+        supabase.table("batches").update({
+            "status": "ACTIVE"
+        }).eq("batch_id", batch_id).eq("status", "FINALIZING").execute()
+        raise
+
 
-    # Fetch readings in insertion order
-    response = supabase.table("harvest_data") \
-        .select("sensor_data") \
-        .eq("batch_id", batch_id) \
-        .order("created_at", desc=False) \
-        .execute()
+def _anchor_batch(batch_id):
+    from routes.merkle_tree import leaves_and_root
+    from routes.blockchain import store_merkle_root_on_chain
+    from routes.offload import offload
 
-    readings = []
+    # Fetch readings in insertion order (paged: max-rows would
+    # silently truncate the batch)
+    rows = fetch_all(lambda: supabase.table("harvest_data")
+                     .select("sensor_data")
+                     .eq("batch_id", batch_id)
+                     .order("created_at", desc=False))
 
-    for row in response.data:
-        if isinstance(row["sensor_data"], list):
-            readings.extend(row["sensor_data"])
-        else:
-            readings.append(row["sensor_data"])
+    readings = list(readings_of(rows))
 
     if not readings:
-        raise Exception("No sensor data found for batch")
+        raise NoReadings("No sensor data found for batch")
 
-    hashes = [hash_reading(r) for r in readings]
-    root = merkle_root(hashes)
+    with MERKLE_LATENCY.time(size=size_bucket(len(readings))):
+        # CPU-bound: keep it off the gevent hub
+        hashes, root = offload(leaves_and_root, readings)
 
     tx_hash = store_merkle_root_on_chain(
         batch_id,
         "0x" + root
     )
 
-    supabase.table("batches").update({
-        "status": "FINALIZED",
-        "end_date": datetime.utcnow().isoformat(),
-        "merkle_root": "0x" + root,
-        "blockchain_tx": tx_hash
-    }).eq("batch_id", batch_id).execute()
+    # From here on the root is on chain: no rollback to ACTIVE
+    try:
+        supabase.table("batches").update({
+            "status": "FINALIZED",
+            "end_date": datetime.utcnow().isoformat(),
+            "merkle_root": "0x" + root,
+            "blockchain_tx": tx_hash
+        }).eq("batch_id", batch_id).eq("status", "FINALIZING").execute()
+    except Exception as e:
+        raise AnchoredNotRecorded(batch_id, root, tx_hash, e) from e
 
     supabase.table("harvest_data").update({
         "merkle_root": "0x" + root,
         "blockchain_tx": tx_hash
     }).eq("batch_id", batch_id).execute()
 
+    # Only now: a re-read before the update would cache the old batch again
+    invalidate_batch(batch_id)
+
+    # 📡 Cached /latest payloads still say PENDING
+    hub.forget(batch_id)
+
+    # 🗄️ Cold storage: readings are immutable from here on
+    from routes.batch_archive import ARCHIVE_ENABLED, archive_batch
+
+    if ARCHIVE_ENABLED:
+        try:
+            archive_batch(batch_id, readings, hashes, "0x" + root, tx_hash)
+        except Exception as e:
+            print("⚠️ Batch archive failed:", batch_id, e)
+
     return root, tx_hash
 
 
@@ -204,7 +293,28 @@ def finalize_batch():
         if batch.data["status"] != "ACTIVE":
             return jsonify({"error": "Batch is not active"}), 400
 
-        root, tx_hash = _finalize_batch_with_blockchain(batch_id)
+        # One finalize per batch at a time; other farms run in parallel
+        lock = partition_lock(("finalize", batch_id))
+        if not lock.acquire(blocking=False):
+            return jsonify({"error": "Batch finalize already in progress"}), 409
+
+        try:
+            # A finalize holding the lock may have completed since the check
+            current = supabase.table("batches") \
+                .select("status") \
+                .eq("batch_id", batch_id) \
+                .limit(1) \
+                .execute()
+
+            if not current.data or current.data[0]["status"] != "ACTIVE":
+                return jsonify({"error": "Batch is not active"}), 400
+
+            root, tx_hash = _finalize_batch_with_blockchain(batch_id)
+        except BatchNotActive:
+            # Another worker / the scheduler claimed it first
+            return jsonify({"error": "Batch finalize already in progress"}), 409
+        finally:
+            lock.release()
 
         return jsonify({
             "message": "Batch finalized successfully",
@@ -218,3 +328,69 @@ def finalize_batch():
             "error": "Failed to finalize batch",
             "details": str(e)
         }), 500
+
+
+# =========================================================
+# GET: Export batch readings (archive first, DB fallback)
+# GET /api/batch/<batch_id>/export[?format=columns]
+# =========================================================
+@batch_bp.route("/batch/<batch_id>/export", methods=["GET"])
+def export_batch(batch_id):
+    from routes.batch_archive import is_archived, load_manifest, load_column, load_readings
+    from routes.metric_stats import METRICS
+
+    try:
+        if is_archived(batch_id):
+            manifest = load_manifest(batch_id)
+
+            if request.args.get("format") == "columns":
+                columns = {"timestamp": load_column(batch_id, "timestamp").tolist()}
+                for metric in METRICS:
+                    # NaN is not valid JSON → None
+                    columns[metric] = [
+                        None if v != v else v
+                        for v in load_column(batch_id, metric).tolist()
+                    ]
+
+                return jsonify({
+                    "batch_id": batch_id,
+                    "source": "archive",
+                    "row_count": manifest["row_count"],
+                    "merkle_root": manifest["merkle_root"],
+                    "columns": columns
+                }), 200
+
+            return jsonify({
+                "batch_id": batch_id,
+                "source": "archive",
+                "row_count": manifest["row_count"],
+                "merkle_root": manifest["merkle_root"],
+                "readings": load_readings(batch_id)
+            }), 200
+
+        response = supabase.table("harvest_data") \
+            .select("sensor_data") \
+            .eq("batch_id", batch_id) \
+            .order("created_at", desc=False) \
+            .execute()
+
+        readings = []
+
+        for row in response.data:
+            if isinstance(row["sensor_data"], list):
+                readings.extend(row["sensor_data"])
+            else:
+                readings.append(row["sensor_data"])
+
+        return jsonify({
+            "batch_id": batch_id,
+            "source": "database",
+            "row_count": len(readings),
+            "readings": readings
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            "error": "Failed to export batch",
+            "details": str(e)
+        }), 500
@@ -0,0 +1,156 @@
+"""
+Columnar cold storage for FINALIZED batches.
+
+Once a batch is finalized its readings never change, so they are written
+once to a local object-store directory:
+
+    <ARCHIVE_DIR>/<batch_id>/
+        manifest.json        batch metadata, row count, per-file sha256
+        leaf_hash.npy        Merkle leaf hashes (S64), in leaf order
+        timestamp.npy        reading timestamps (unicode)
+        <metric>.npy         one float64 column per metric (NaN = missing)
+        readings.json.gz     canonical readings, for byte-exact export
+
+.npy columns are stored uncompressed so they can be memory-mapped;
+the full readings are gzip-compressed since they are only read on export.
+"""
+
+from datetime import datetime
+import numpy as np
+import hashlib
+import shutil
+import json
+import gzip
+import os
+import re
+
+from routes.metric_stats import METRICS, extract_metrics
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", os.path.join(BASE_DIR, "archive"))
+ARCHIVE_ENABLED = os.getenv("ARCHIVE_ENABLED", "1") == "1"
+
+ARCHIVE_VERSION = 1
+_SAFE_ID = re.compile(r"^[A-Za-z0-9_\-]+$")
+
+
+def _batch_dir(batch_id: str) -> str:
+    if not _SAFE_ID.match(batch_id or ""):
+        raise ValueError("Invalid batch id for archive")
+    return os.path.join(ARCHIVE_DIR, batch_id)
+
+
+def _sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def is_archived(batch_id: str) -> bool:
+    try:
+        return os.path.exists(os.path.join(_batch_dir(batch_id), "manifest.json"))
+    except ValueError:
+        return False
+
+
+# =========================================================
+# WRITE: archive a finalized batch (atomic directory swap)
+# =========================================================
+def archive_batch(batch_id, readings, leaf_hashes, merkle_root_hex, tx_hash):
+    final_dir = _batch_dir(batch_id)
+    tmp_dir = final_dir + ".tmp"
+
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    np.save(
+        os.path.join(tmp_dir, "leaf_hash.npy"),
+        np.array(leaf_hashes, dtype="S64")
+    )
+    np.save(
+        os.path.join(tmp_dir, "timestamp.npy"),
+        np.array([str(r.get("timestamp") or "") for r in readings])
+    )
+
+    flat = [extract_metrics(r) for r in readings]
+    for metric in METRICS:
+        np.save(
+            os.path.join(tmp_dir, f"{metric}.npy"),
+            np.array([m.get(metric, np.nan) for m in flat], dtype=np.float64)
+        )
+
+    with gzip.open(os.path.join(tmp_dir, "readings.json.gz"), "wt", encoding="utf-8") as f:
+        json.dump(readings, f, separators=(",", ":"))
+
+    files = {
+        name: _sha256_file(os.path.join(tmp_dir, name))
+        for name in sorted(os.listdir(tmp_dir))
+    }
+
+    manifest = {
+        "version": ARCHIVE_VERSION,
+        "batch_id": batch_id,
+        "row_count": len(readings),
+        "merkle_root": merkle_root_hex,
+        "blockchain_tx": tx_hash,
+        "archived_at": datetime.utcnow().isoformat(),
+        "metrics": list(METRICS),
+        "files": files,
+        "checksum": hashlib.sha256(
+            "".join(f"{k}:{v}" for k, v in files.items()).encode()
+        ).hexdigest()
+    }
+
+    with open(os.path.join(tmp_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    shutil.rmtree(final_dir, ignore_errors=True)
+    os.replace(tmp_dir, final_dir)
+
+    print("🗄️ Archived batch:", batch_id, "rows:", len(readings))
+    return manifest
+
+
+# =========================================================
+# READ: manifest, columns (memory-mapped), leaf hashes, readings
+# =========================================================
+def load_manifest(batch_id: str) -> dict:
+    with open(os.path.join(_batch_dir(batch_id), "manifest.json")) as f:
+        return json.load(f)
+
+
+def _verified_path(batch_id: str, manifest: dict, name: str) -> str:
+    path = os.path.join(_batch_dir(batch_id), name)
+    if _sha256_file(path) != manifest["files"].get(name):
+        raise ValueError(f"Archive checksum mismatch: {batch_id}/{name}")
+    return path
+
+
+def load_column(batch_id: str, column: str):
+    """
+    Memory-mapped, read-only NumPy view of one archived column.
+    """
+
+    if column not in METRICS and column != "timestamp":
+        raise ValueError(f"Unknown column: {column}")
+
+    return np.load(
+        os.path.join(_batch_dir(batch_id), f"{column}.npy"),
+        mmap_mode="r"
+    )
+
+
+def load_leaf_hashes(batch_id: str):
+    manifest = load_manifest(batch_id)
+    path = _verified_path(batch_id, manifest, "leaf_hash.npy")
+    leaves = np.load(path, mmap_mode="r")
+    return [h.decode("ascii") for h in leaves.tolist()], manifest
+
+
+def load_readings(batch_id: str):
+    manifest = load_manifest(batch_id)
+    path = _verified_path(batch_id, manifest, "readings.json.gz")
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
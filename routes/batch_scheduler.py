@@ -0,0 +1,255 @@
+"""
+Background auto-finalize scheduler.
+
+Every AUTO_FINALIZE_INTERVAL seconds (or immediately when nudged by
+ingest) the scheduler lists ACTIVE batches, applies the policy in
+routes/blockchain_automation.py and finalizes due batches on a
+bounded pool (AUTO_FINALIZE_CONCURRENCY), off the request path.
+With AUTO_FINALIZE_ROLLOVER=1 a new ACTIVE batch is opened for the
+same farm so ingestion keeps flowing.
+
+Only one process per host runs the loop (flock on
+AUTO_FINALIZE_LOCK); the other workers stay idle. Across hosts (and
+against a manual finalize) the conditional ACTIVE → FINALIZING claim
+in routes/batch.py decides: whoever loses it skips the batch.
+
+    GET /api/batch/scheduler/status
+"""
+
+from flask import Blueprint, jsonify
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import threading
+import tempfile
+import fcntl
+import os
+
+from routes import blockchain_automation as policy
+from routes.metrics import gauge, histogram
+
+scheduler_bp = Blueprint("scheduler", __name__)
+
+AUTO_FINALIZE_ENABLED = os.getenv("AUTO_FINALIZE_ENABLED", "0") == "1"
+AUTO_FINALIZE_INTERVAL = float(os.getenv("AUTO_FINALIZE_INTERVAL", "30"))
+AUTO_FINALIZE_CONCURRENCY = int(os.getenv("AUTO_FINALIZE_CONCURRENCY", "2"))
+AUTO_FINALIZE_ROLLOVER = os.getenv("AUTO_FINALIZE_ROLLOVER", "1") == "1"
+AUTO_FINALIZE_LOCK = os.getenv(
+    "AUTO_FINALIZE_LOCK",
+    os.path.join(tempfile.gettempdir(), "agrichain_scheduler.lock")
+)
+
+FINALIZE_LAG = histogram(
+    "auto_finalize_lag_seconds",
+    "Time from batch becoming due to finalize completing",
+    labels=("reason",),
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+)
+
+status = {
+    "enabled": AUTO_FINALIZE_ENABLED,
+    "leader": False,
+    "last_tick": None,
+    "last_error": None,
+    "in_flight": {},          # batch_id -> {reason, since}
+    "finalized": 0,
+    "failed": 0,
+    "active_batches": 0,
+    "due_batches": 0,
+    "oldest_active_age_s": None,
+    "recent": []
+}
+
+# The pool threads update status while the route serializes it
+_status_lock = threading.Lock()
+_wake = threading.Event()
+_pool = ThreadPoolExecutor(
+    max_workers=AUTO_FINALIZE_CONCURRENCY,
+    thread_name_prefix="auto-finalize"
+)
+_lock_file = None
+_started = False
+
+gauge("auto_finalize_in_flight", "Batches being finalized", lambda: len(status["in_flight"]))
+gauge("auto_finalize_due_batches", "ACTIVE batches due for finalize", lambda: status["due_batches"])
+gauge(
+    "auto_finalize_oldest_active_age_seconds",
+    "Age of the oldest ACTIVE batch",
+    lambda: status["oldest_active_age_s"] or 0
+)
+
+
+def nudge(batch_id=None):
+    _wake.set()
+
+
+# =========================================================
+# Worker: finalize one batch (+ optional rollover)
+# =========================================================
+def _finalize(batch, reason, due_at):
+    from routes.batch import _finalize_batch_with_blockchain, _create_batch, BatchNotActive, NoReadings
+    from routes.farm_routing import partition_lock, DEFAULT_FARM
+
+    batch_id = batch["batch_id"]
+    lock = partition_lock(("finalize", batch_id))
+
+    if not lock.acquire(blocking=False):
+        with _status_lock:
+            status["in_flight"].pop(batch_id, None)
+        return
+
+    try:
+        root, tx_hash = _finalize_batch_with_blockchain(batch_id)
+        # Lag from when the batch became due, not from the submit
+        FINALIZE_LAG.observe((datetime.utcnow() - due_at).total_seconds(), reason=reason)
+        with _status_lock:
+            status["finalized"] += 1
+            status["recent"] = ([{
+                "batch_id": batch_id,
+                "reason": reason,
+                "merkle_root": "0x" + root,
+                "tx_hash": tx_hash,
+                "at": datetime.utcnow().isoformat()
+            }] + status["recent"])[:20]
+        print("⏰ Auto-finalized:", batch_id, "reason:", reason, "tx:", tx_hash)
+
+        if AUTO_FINALIZE_ROLLOVER:
+            _create_batch(
+                batch.get("farm_id") or DEFAULT_FARM,
+                batch.get("crop"),
+                batch.get("location")
+            )
+
+    except BatchNotActive:
+        # Claimed by a manual finalize or another host since the tick
+        pass
+
+    except NoReadings:
+        # Due by age / schedule but still empty: nothing to anchor
+        pass
+
+    except Exception as e:
+        with _status_lock:
+            status["failed"] += 1
+            status["last_error"] = f"{batch_id}: {e}"
+        print("⚠️ Auto-finalize failed:", batch_id, e)
+
+    finally:
+        lock.release()
+        with _status_lock:
+            status["in_flight"].pop(batch_id, None)
+
+
+# =========================================================
+# Loop: evaluate policy for every ACTIVE batch
+# =========================================================
+def _tick():
+    from routes.batch import supabase
+    from routes.batch_summary import load_reading_count
+
+    res = supabase.table("batches") \
+        .select("batch_id, farm_id, crop, location, start_date") \
+        .eq("status", "ACTIVE") \
+        .order("start_date", desc=False) \
+        .execute()
+
+    now = datetime.utcnow()
+    due = 0
+    oldest = None
+
+    for batch in res.data:
+        started = policy._parse_time(batch.get("start_date"))
+        if started is not None:
+            age = (now - started).total_seconds()
+            oldest = age if oldest is None else max(oldest, age)
+
+        batch_id = batch["batch_id"]
+        if batch_id in status["in_flight"]:
+            due += 1
+            continue
+
+        reason, due_at = policy.finalize_due(
+            batch.get("start_date"),
+            load_reading_count(batch_id),
+            now
+        )
+        if not reason:
+            continue
+
+        due += 1
+        with _status_lock:
+            status["in_flight"][batch_id] = {"reason": reason, "since": due_at.isoformat()}
+        _pool.submit(_finalize, batch, reason, due_at)
+
+    with _status_lock:
+        status["active_batches"] = len(res.data)
+        status["due_batches"] = due
+        status["oldest_active_age_s"] = round(oldest, 1) if oldest is not None else None
+        status["last_tick"] = now.isoformat()
+
+
+def _acquire_leadership():
+    global _lock_file
+    try:
+        _lock_file = open(AUTO_FINALIZE_LOCK, "w")
+        fcntl.flock(_lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        if _lock_file:
+            _lock_file.close()
+            _lock_file = None
+        return False
+
+
+def _loop():
+    while True:
+        if not status["leader"]:
+            status["leader"] = _acquire_leadership()
+
+        if status["leader"]:
+            try:
+                _tick()
+            except Exception as e:
+                with _status_lock:
+                    status["last_error"] = str(e)
+                print("⚠️ Scheduler tick failed:", e)
+
+        _wake.wait(AUTO_FINALIZE_INTERVAL)
+        _wake.clear()
+
+
+def start():
+    global _started
+    if _started or not AUTO_FINALIZE_ENABLED:
+        return
+    _started = True
+
+    policy.set_scheduler_nudge(nudge)
+    threading.Thread(target=_loop, name="auto-finalize-scheduler", daemon=True).start()
+    print("⏰ Auto-finalize scheduler started")
+
+
+# =========================================================
+# GET: Scheduler status & lag
+# GET /api/batch/scheduler/status
+# =========================================================
+@scheduler_bp.route("/batch/scheduler/status", methods=["GET"])
+def scheduler_status():
+    # Snapshot: jsonify must not iterate dicts the pool is mutating
+    with _status_lock:
+        snapshot = {
+            **status,
+            "in_flight": dict(status["in_flight"]),
+            "recent": list(status["recent"])
+        }
+
+    return jsonify({
+        **snapshot,
+        "policy": {
+            "max_readings": policy.BATCH_SIZE,
+            "max_age_seconds": policy.MAX_BATCH_AGE,
+            "schedule_utc": policy.SCHEDULE,
+            "interval_seconds": AUTO_FINALIZE_INTERVAL,
+            "concurrency": AUTO_FINALIZE_CONCURRENCY,
+            "rollover": AUTO_FINALIZE_ROLLOVER
+        }
+    }), 200
@@ -0,0 +1,164 @@
+"""
+Per-batch running aggregates, materialized on ingest.
+
+Supabase table (one row per batch):
+
+    create table batch_summaries (
+        batch_id      text primary key,
+        reading_count integer not null default 0,
+        stats         jsonb   not null,
+        updated_at    timestamptz
+    );
+
+Ingest only ever sends deltas; the database applies them atomically,
+so any number of workers (and a rebuild) never overwrite each other:
+
+    create or replace function merge_stats(a jsonb, b jsonb) returns jsonb
+    language sql immutable as $$
+        select coalesce(a, '{}'::jsonb) || coalesce((
+            select jsonb_object_agg(metric, case
+                when a ? metric then jsonb_build_object(
+                    'count', (a->metric->>'count')::numeric + (s->>'count')::numeric,
+                    'sum',   (a->metric->>'sum')::numeric   + (s->>'sum')::numeric,
+                    'sumsq', (a->metric->>'sumsq')::numeric + (s->>'sumsq')::numeric,
+                    'min',   least((a->metric->>'min')::numeric,    (s->>'min')::numeric),
+                    'max',   greatest((a->metric->>'max')::numeric, (s->>'max')::numeric),
+                    'last',  s->'last')
+                else s end)
+            from jsonb_each(b) as e(metric, s)
+        ), '{}'::jsonb)
+    $$;
+
+    create or replace function merge_batch_summary(
+        p_batch_id text, p_count integer, p_stats jsonb
+    ) returns integer language sql as $$
+        insert into batch_summaries as s (batch_id, reading_count, stats, updated_at)
+        values (p_batch_id, p_count, p_stats, now())
+        on conflict (batch_id) do update
+           set reading_count = s.reading_count + excluded.reading_count,
+               stats         = merge_stats(s.stats, excluded.stats),
+               updated_at    = now()
+        returning reading_count
+    $$;
+
+Rebuild from harvest_data:
+
+    python -m routes.batch_summary <batch_id> [<batch_id> ...]
+"""
+
+from supabase import create_client
+from datetime import datetime
+import os
+import sys
+
+from routes.metric_stats import add_reading, describe
+from routes.metrics import instrument_supabase
+from routes.paging import fetch_all, readings_of
+
+# -------------------------------
+# Supabase Configuration
+# -------------------------------
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+supabase = instrument_supabase(create_client(SUPABASE_URL, SUPABASE_KEY))
+
+SUMMARY_TABLE = "batch_summaries"
+
+
+def _load_summary(batch_id: str) -> dict:
+    res = supabase.table(SUMMARY_TABLE) \
+        .select("reading_count, stats") \
+        .eq("batch_id", batch_id) \
+        .limit(1) \
+        .execute()
+
+    if res.data:
+        return {
+            "reading_count": res.data[0]["reading_count"],
+            "stats": res.data[0]["stats"] or {}
+        }
+
+    return {"reading_count": 0, "stats": {}}
+
+
+def _save_summary(batch_id: str, summary: dict) -> None:
+    supabase.table(SUMMARY_TABLE).upsert({
+        "batch_id": batch_id,
+        "reading_count": summary["reading_count"],
+        "stats": summary["stats"],
+        "updated_at": datetime.utcnow().isoformat()
+    }, on_conflict="batch_id").execute()
+
+
+# =========================================================
+# INGEST HOOK: fold readings into the batch summary
+# =========================================================
+def merge_summary(batch_id: str, readings) -> int:
+    """
+    Add a chunk of readings in one atomic round trip.
+    Returns the batch's new reading_count.
+    """
+
+    stats = {}
+    count = 0
+    for reading in readings:
+        count += 1
+        add_reading(stats, reading)
+
+    res = supabase.rpc("merge_batch_summary", {
+        "p_batch_id": batch_id,
+        "p_count": count,
+        "p_stats": stats
+    }).execute()
+
+    return int(res.data)
+
+
+# =========================================================
+# READ: O(1) summary for a batch
+# =========================================================
+def get_summary(batch_id: str) -> dict:
+    summary = _load_summary(batch_id)
+
+    return {
+        "batch_id": batch_id,
+        "reading_count": summary["reading_count"],
+        "metrics": {
+            metric: describe(stats)
+            for metric, stats in summary["stats"].items()
+        }
+    }
+
+
+def load_reading_count(batch_id: str) -> int:
+    return _load_summary(batch_id)["reading_count"]
+
+
+# =========================================================
+# REBUILD: recompute a summary from harvest_data
+# =========================================================
+def rebuild_summary(batch_id: str) -> dict:
+    rows = fetch_all(lambda: supabase.table("harvest_data")
+                     .select("sensor_data")
+                     .eq("batch_id", batch_id)
+                     .order("created_at", desc=False))
+
+    summary = {"reading_count": 0, "stats": {}}
+
+    for reading in readings_of(rows):
+        summary["reading_count"] += 1
+        add_reading(summary["stats"], reading)
+
+    _save_summary(batch_id, summary)
+
+    return get_summary(batch_id)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("usage: python -m routes.batch_summary <batch_id> [...]")
+        sys.exit(1)
+
+    for arg in sys.argv[1:]:
+        result = rebuild_summary(arg)
+        print("✅ Rebuilt summary:", arg, "readings:", result["reading_count"])
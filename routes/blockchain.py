@@ -2,11 +2,14 @@ from flask import Blueprint, jsonify
 from web3 import Web3
 import os
 import json
+import threading
 from datetime import datetime
 from supabase import create_client
 
-from routes.hash_readings import hash_reading
-from routes.merkle_tree import merkle_root
+from routes.merkle_tree import leaves_and_root
+from routes.offload import offload
+from routes.metrics import instrument_supabase, instrument_web3, MERKLE_LATENCY, size_bucket
+from routes import http_cache
 
 # ---------------------------------
 # Blueprint
@@ -18,7 +21,7 @@ blockchain_bp = Blueprint("blockchain", __name__)
 # ---------------------------------
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+supabase = instrument_supabase(create_client(SUPABASE_URL, SUPABASE_KEY))
 
 # ---------------------------------
 # Blockchain Configuration (Sepolia)
@@ -29,7 +32,11 @@ CONTRACT_ADDRESS = "0xb8E82a2247b1E6a358220C8C24Ba53e89b411138"
 WALLET_ADDRESS = os.getenv("WALLET_ADDRESS")
 PRIVATE_KEY = os.getenv("PRIVATE_KEY")
 
-w3 = Web3(Web3.HTTPProvider(SEPOLIA_RPC_URL))
+# Nonce allocation + send must be serialized so parallel finalizes
+# (one per farm) never reuse a nonce; receipts are awaited unlocked
+_send_lock = threading.Lock()
+
+w3 = instrument_web3(Web3(Web3.HTTPProvider(SEPOLIA_RPC_URL)))
 
 with open("abi.json") as f:
     abi = json.load(f)
@@ -46,7 +53,15 @@ def store_merkle_root_on_chain(batch_id: str, merkle_root_hex: str) -> str:
     clean_root = merkle_root_hex.replace("0x", "")
     data_hash = "0x" + clean_root
 
-    nonce = w3.eth.get_transaction_count(WALLET_ADDRESS)
+    with _send_lock:
+        tx_hash = _send_add_harvest(batch_id, data_hash)
+
+    receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
+    return "0x" + receipt.transactionHash.hex().replace("0x", "")
+
+
+def _send_add_harvest(batch_id: str, data_hash: str):
+    nonce = w3.eth.get_transaction_count(WALLET_ADDRESS, "pending")
 
     tx = contract.functions.addHarvest(
         batch_id,
@@ -64,10 +79,7 @@ def store_merkle_root_on_chain(batch_id: str, merkle_root_hex: str) -> str:
     })
 
     signed_tx = w3.eth.account.sign_transaction(tx, PRIVATE_KEY)
-    tx_hash = w3.eth.send_raw_transaction(signed_tx.raw_transaction)
-
-    receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
-    return "0x" + receipt.transactionHash.hex().replace("0x", "")
+    return w3.eth.send_raw_transaction(signed_tx.raw_transaction)
 
 
 # =========================================================
@@ -114,8 +126,7 @@ def verify_using_snapshot(batch_id: str):
     stored_root = row["merkle_root"].replace("0x", "")
     sensor_data = row["sensor_data"]
 
-    hashes = [hash_reading(r) for r in sensor_data]
-    recomputed = merkle_root(hashes)
+    _, recomputed = offload(leaves_and_root, sensor_data)
 
     return stored_root == recomputed, {
         "stored": "0x" + stored_root,
@@ -127,6 +138,11 @@ def verify_using_snapshot(batch_id: str):
 # =========================================================
 @blockchain_bp.route("/verify/<batch_id>", methods=["GET"])
 def verify_batch(batch_id):
+    # Conditional GET: 304 before touching the database
+    response = http_cache.precheck(("verify", batch_id))
+    if response is not None:
+        return response
+
     try:
         # 1️⃣ Fetch committed snapshot (NOT pending)
         response = supabase.table("harvest_data") \
@@ -154,18 +170,22 @@ def verify_batch(batch_id):
             }), 400
 
         # 2️⃣ Recompute Merkle root
-        hashes = [hash_reading(r) for r in sensor_data]
-        recomputed_root = "0x" + merkle_root(hashes).replace("0x", "")
+        with MERKLE_LATENCY.time(size=size_bucket(len(sensor_data))):
+            _, root = offload(leaves_and_root, sensor_data)
+            recomputed_root = "0x" + root.replace("0x", "")
 
         verified = stored_root.lower() == recomputed_root.lower()
 
-        return jsonify({
+        # Committed snapshots never change → immutable once verified;
+        # a mismatch is revalidated so a repaired batch is picked up
+        return http_cache.immutable_json(("verify", batch_id), {
             "batch_id": batch_id,
             "verified": verified,
             "stored_merkle_root": stored_root,
             "recomputed_merkle_root": recomputed_root,
             "tx_hash": tx_hash
-        }), 200
+        }, http_cache.strong_etag(stored_root, tx_hash, recomputed_root, verified),
+            immutable=verified)
 
     except Exception as e:
         return jsonify({
@@ -1,36 +1,102 @@
-from routes.hash_readings import hash_reading
-from routes.merkle_tree import merkle_root
-from routes.blockchain import store_merkle_root_on_chain
-import time
+from datetime import datetime, timedelta
+import os
 
-BATCH_SIZE = 5
-sensor_buffer = []
+# =========================================================
+# AUTO-FINALIZE POLICY
+#
+# Readings are buffered durably in harvest_data (merkle_root =
+# "PENDING") with their count in batch_summaries, so nothing is lost
+# on restart. routes/batch_scheduler.py evaluates this policy off the
+# request path and anchors due batches.
+# =========================================================
 
-def add_reading_and_maybe_commit(reading):
-    global sensor_buffer
+# Finalize once a batch holds this many readings (0 = off)
+BATCH_SIZE = int(os.getenv("AUTO_FINALIZE_MAX_READINGS", "1000"))
 
-    sensor_buffer.append(reading)
-    print("📦 Buffer size:", len(sensor_buffer))
+# Finalize once a batch is this old, in seconds (0 = off)
+MAX_BATCH_AGE = float(os.getenv("AUTO_FINALIZE_MAX_AGE_SECONDS", "0"))
 
-    if len(sensor_buffer) >= BATCH_SIZE:
-        print("🔗 Batch full → generating Merkle root")
+# Daily UTC wall-clock slots, cron-like: "06:00,18:00" ("" = off)
+SCHEDULE = [
+    s.strip() for s in os.getenv("AUTO_FINALIZE_AT", "").split(",") if s.strip()
+]
 
-        hashes = [hash_reading(r) for r in sensor_buffer]
-        root = merkle_root(hashes)
+_scheduler_nudge = None
 
-        batch_id = f"BATCH_{int(time.time())}"
 
-        tx_hash = store_merkle_root_on_chain(batch_id, root)
+def _parse_time(value):
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).replace(tzinfo=None)
+    except ValueError:
+        return None
 
-        print("✅ Merkle root committed:", root)
-        print("🔗 Tx hash:", tx_hash)
 
-        sensor_buffer.clear()
+def _last_slot(now: datetime):
+    """
+    Most recent scheduled slot at or before now.
+    """
 
-        return {
-            "batch_id": batch_id,
-            "merkle_root": root,
-            "tx_hash": tx_hash
-        }
+    latest = None
+    for slot in SCHEDULE:
+        hour, minute = (int(x) for x in slot.split(":"))
+        at = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if at > now:
+            at -= timedelta(days=1)
+        if latest is None or at > latest:
+            latest = at
+    return latest
 
-    return None
+
+def finalize_due(start_date, reading_count: int, now: datetime = None):
+    """
+    (reason, due_at) if a batch is due for finalize, else (None, None).
+    due_at is when it became due (naive UTC); for the size policy that
+    is unknown and `now` is used (ingest nudges the scheduler as soon
+    as the count is reached).
+    """
+
+    now = now or datetime.utcnow()
+
+    # Only the size policy reads the summary count: it can lag (spooled
+    # readings, a failed summary update), age and schedule must not
+    if BATCH_SIZE and reading_count >= BATCH_SIZE:
+        return "reading_count", now
+
+    started = _parse_time(start_date)
+    if started is None:
+        return None, None
+
+    if MAX_BATCH_AGE and (now - started).total_seconds() >= MAX_BATCH_AGE:
+        return "max_age", started + timedelta(seconds=MAX_BATCH_AGE)
+
+    slot = _last_slot(now) if SCHEDULE else None
+    if slot is not None and started < slot:
+        return "schedule", slot
+
+    return None, None
+
+
+def finalize_reason(start_date, reading_count: int, now: datetime = None):
+    """
+    Why a batch is due for finalize, or None if it is not.
+    """
+
+    return finalize_due(start_date, reading_count, now)[0]
+
+
+def set_scheduler_nudge(fn):
+    global _scheduler_nudge
+    _scheduler_nudge = fn
+
+
+def add_reading_and_maybe_commit(batch_id: str, reading_count: int):
+    """
+    Ingest hook. Never blocks on the chain: when the size policy is
+    met it only wakes the scheduler, which finalizes in the background.
+    """
+
+    if BATCH_SIZE and reading_count >= BATCH_SIZE and _scheduler_nudge:
+        _scheduler_nudge(batch_id)
+        return True
+
+    return False
@@ -0,0 +1,154 @@
+"""
+Idempotent ingest: device sequence numbers + idempotency keys.
+
+Each reading is identified by the `Idempotency-Key` header or, for
+ESP32 clients, by `device_id` + `seq` (+ optional `boot` nonce so a
+reflashed device that restarts at seq 0 does not collide):
+
+    ESP32_00042:7f3a:1289
+
+The unique index is the source of truth; a bounded in-process LRU of
+recently seen keys answers retries without a database round trip.
+A key already stored is a duplicate whatever its batch's state: a
+device retrying after finalize must get an ack, not an error.
+
+    alter table harvest_data add column device_id text;
+    alter table harvest_data add column seq bigint;
+    alter table harvest_data add column idempotency_key text;
+    create unique index harvest_data_idempotency_key
+        on harvest_data (idempotency_key);
+"""
+
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from supabase import create_client
+import threading
+import os
+
+from routes.reading import ReadingError
+from routes.metrics import gauge, instrument_supabase
+
+# -------------------------------
+# Supabase Configuration
+# -------------------------------
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+supabase = instrument_supabase(create_client(SUPABASE_URL, SUPABASE_KEY))
+
+IDEMPOTENCY_LRU_SIZE = int(os.getenv("IDEMPOTENCY_LRU_SIZE", "100000"))
+MAX_KEY_LENGTH = 200
+
+
+class RecentKeys:
+    """
+    Bounded LRU set of idempotency keys already stored.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+
+    def seen(self, key) -> bool:
+        with self._lock:
+            if key in self._keys:
+                self._keys.move_to_end(key)
+                self.hits += 1
+                return True
+            return False
+
+    def add(self, key) -> None:
+        with self._lock:
+            self._keys[key] = None
+            self._keys.move_to_end(key)
+            while len(self._keys) > self.maxsize:
+                self._keys.popitem(last=False)
+
+    def __len__(self):
+        return len(self._keys)
+
+
+recent = RecentKeys(IDEMPOTENCY_LRU_SIZE)
+stats = {"duplicates": 0}
+
+gauge("ingest_idempotency_cache_keys", "Idempotency keys held in memory", lambda: len(recent))
+gauge("ingest_duplicates_total", "Retried readings dropped as duplicates", lambda: stats["duplicates"])
+
+
+def idempotency_key(data: dict, headers=None):
+    """
+    Key for this reading, or None for legacy payloads without one.
+    """
+
+    key = headers.get("Idempotency-Key") if headers is not None else None
+    if key:
+        key = key.strip()
+        if len(key) > MAX_KEY_LENGTH:
+            raise ReadingError("Idempotency-Key is too long")
+        return key
+
+    seq = data.get("seq")
+    if seq is None:
+        return None
+
+    device_id = data.get("device_id")
+    if not device_id:
+        raise ReadingError("seq requires device_id")
+    if isinstance(seq, bool) or not isinstance(seq, int) or seq < 0:
+        raise ReadingError("seq must be a non-negative integer")
+
+    boot = data.get("boot")
+    key = f"{device_id}:{boot}:{seq}" if boot else f"{device_id}:{seq}"
+    if len(key) > MAX_KEY_LENGTH:
+        raise ReadingError("device_id / boot is too long")
+    return key
+
+
+def mark_duplicate(count=1) -> None:
+    stats["duplicates"] += count
+
+
+def stored_keys(keys) -> set:
+    """
+    The keys already in harvest_data (LRU first, then the unique
+    index). Used when a reading cannot be routed, e.g. its batch was
+    finalized: if it was stored before, the retry is a duplicate.
+    """
+
+    keys = [k for k in keys if k]
+    found = {k for k in keys if recent.seen(k)}
+    missing = [k for k in keys if k not in found]
+
+    if missing:
+        res = supabase.table("harvest_data") \
+            .select("idempotency_key") \
+            .in_("idempotency_key", missing) \
+            .execute()
+
+        for row in res.data:
+            recent.add(row["idempotency_key"])
+            found.add(row["idempotency_key"])
+
+    return found
+
+
+# =========================================================
+# Explicit, strictly increasing created_at
+#
+# Finalize and trace order readings by created_at. A multi-row
+# insert gets one now() for every row, so the backlog path stamps
+# rows itself to keep the order (and the Merkle root) stable.
+# =========================================================
+_clock_lock = threading.Lock()
+_last_created_at = datetime.min
+
+
+def next_created_at() -> str:
+    global _last_created_at
+    with _clock_lock:
+        now = datetime.utcnow()
+        if now <= _last_created_at:
+            now = _last_created_at + timedelta(microseconds=1)
+        _last_created_at = now
+    return now.strftime("%Y-%m-%dT%H:%M:%S.%f+00:00")
@@ -0,0 +1,224 @@
+"""
+Partitioned ingestion: one ACTIVE batch per farm.
+
+Devices are mapped to farms in the `devices` table; each reading is
+routed by device_id → farm_id → that farm's ACTIVE batch. A farm_id in
+the payload is ignored, so a device cannot write into another farm's
+batch. Unmapped devices (and payloads without device_id) use
+DEFAULT_FARM_ID, which is also what pre-existing batches belong to.
+
+The ACTIVE batch cache can be up to ACTIVE_BATCH_TTL stale in other
+workers, so the database is the final word: rows only land in an
+ACTIVE batch, and a finalize's status change waits for in-flight
+inserts (FOR SHARE). Rejected rows are re-routed by ingest.
+
+    alter table batches add column farm_id text not null default 'DEFAULT';
+    create index batches_farm_status on batches (farm_id, status);
+
+    create table devices (
+        device_id text primary key,
+        farm_id   text not null
+    );
+
+    create or replace function harvest_data_batch_open() returns trigger
+    language plpgsql as $$
+    begin
+        perform 1 from batches
+         where batch_id = new.batch_id and status = 'ACTIVE'
+           for share;
+        if not found then
+            raise exception 'batch_not_active: %', new.batch_id
+                using errcode = '55000';
+        end if;
+        return new;
+    end $$;
+
+    create trigger harvest_data_batch_open before insert on harvest_data
+        for each row execute function harvest_data_batch_open();
+"""
+
+from flask import Blueprint, request, jsonify
+from supabase import create_client
+import threading
+import time
+import os
+
+from routes.metrics import instrument_supabase
+
+farm_bp = Blueprint("farms", __name__)
+
+# -------------------------------
+# Supabase Configuration
+# -------------------------------
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+supabase = instrument_supabase(create_client(SUPABASE_URL, SUPABASE_KEY))
+
+DEFAULT_FARM = os.getenv("DEFAULT_FARM_ID", "DEFAULT")
+DEVICE_CACHE_TTL = float(os.getenv("DEVICE_CACHE_TTL", "300"))
+# Kept short: other workers see a finalize / new batch within this window
+ACTIVE_BATCH_TTL = float(os.getenv("ACTIVE_BATCH_TTL", "2"))
+
+# Raised by harvest_data_batch_open() for rows of a non-ACTIVE batch
+BATCH_CLOSED = "batch_not_active"
+
+_device_farms = {}      # device_id -> (farm_id, expires)
+_active_batches = {}    # farm_id -> (batch_id | None, expires)
+_partition_locks = {}   # key -> Lock
+_locks_guard = threading.Lock()
+
+
+def partition_lock(key) -> threading.Lock:
+    """
+    One lock per partition (farm / batch) so work on different
+    farms never serializes on a shared lock.
+    """
+
+    lock = _partition_locks.get(key)
+    if lock is None:
+        with _locks_guard:
+            lock = _partition_locks.setdefault(key, threading.Lock())
+    return lock
+
+
+# =========================================================
+# device → farm
+# =========================================================
+def farm_for_device(device_id) -> str:
+    if not device_id:
+        return DEFAULT_FARM
+
+    cached = _device_farms.get(device_id)
+    if cached and cached[1] > time.time():
+        return cached[0]
+
+    res = supabase.table("devices") \
+        .select("farm_id") \
+        .eq("device_id", device_id) \
+        .limit(1) \
+        .execute()
+
+    farm_id = res.data[0]["farm_id"] if res.data else DEFAULT_FARM
+    _device_farms[device_id] = (farm_id, time.time() + DEVICE_CACHE_TTL)
+    return farm_id
+
+
+def resolve_farm(data: dict) -> str:
+    # Never trust a client-supplied farm_id
+    return farm_for_device(data.get("device_id"))
+
+
+# =========================================================
+# farm → ACTIVE batch (short TTL cache, invalidated on change)
+# =========================================================
+def active_batch_for_farm(farm_id: str):
+    cached = _active_batches.get(farm_id)
+    if cached and cached[1] > time.time():
+        return cached[0]
+
+    res = supabase.table("batches") \
+        .select("batch_id") \
+        .eq("status", "ACTIVE") \
+        .eq("farm_id", farm_id) \
+        .order("start_date", desc=True) \
+        .limit(1) \
+        .execute()
+
+    batch_id = res.data[0]["batch_id"] if res.data else None
+    _active_batches[farm_id] = (batch_id, time.time() + ACTIVE_BATCH_TTL)
+    return batch_id
+
+
+def invalidate_farm(farm_id: str) -> None:
+    _active_batches.pop(farm_id, None)
+
+
+def invalidate_batch(batch_id: str) -> None:
+    for farm_id, (cached_id, _) in list(_active_batches.items()):
+        if cached_id == batch_id:
+            _active_batches.pop(farm_id, None)
+
+
+def batch_closed(error) -> bool:
+    """
+    True if an insert failed because its batch is no longer ACTIVE.
+    """
+
+    return BATCH_CLOSED in str(error)
+
+
+def reroute(rows) -> list:
+    """
+    Point rows at their farm's current ACTIVE batch (re-read, not
+    cached), farm by farm. Returns the rows whose farm has no ACTIVE
+    batch; those are left untouched.
+    """
+
+    routed = {}
+    stranded = []
+    for row in rows:
+        farm_id = resolve_farm(row)
+        if farm_id not in routed:
+            invalidate_farm(farm_id)
+            routed[farm_id] = active_batch_for_farm(farm_id)
+        if not routed[farm_id]:
+            stranded.append(row)
+            continue
+        row["batch_id"] = routed[farm_id]
+    return stranded
+
+
+# =========================================================
+# POST: Assign devices to a farm
+# POST /api/farms/<farm_id>/devices  {"device_ids": [...]}
+# =========================================================
+@farm_bp.route("/farms/<farm_id>/devices", methods=["POST"])
+def assign_devices(farm_id):
+    data = request.get_json(silent=True) or {}
+    device_ids = data.get("device_ids") or []
+
+    if not device_ids:
+        return jsonify({"error": "device_ids is required"}), 400
+
+    try:
+        supabase.table("devices").upsert(
+            [{"device_id": d, "farm_id": farm_id} for d in device_ids],
+            on_conflict="device_id"
+        ).execute()
+
+        for device_id in device_ids:
+            _device_farms.pop(device_id, None)
+
+        return jsonify({
+            "message": "Devices assigned",
+            "farm_id": farm_id,
+            "devices": len(device_ids)
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            "error": "Device assignment failed",
+            "details": str(e)
+        }), 500
+
+
+# =========================================================
+# GET: ACTIVE batch per farm
+# GET /api/farms/active
+# =========================================================
+@farm_bp.route("/farms/active", methods=["GET"])
+def active_batches():
+    try:
+        res = supabase.table("batches") \
+            .select("batch_id, farm_id, crop, location, start_date") \
+            .eq("status", "ACTIVE") \
+            .order("start_date", desc=True) \
+            .execute()
+
+        return jsonify(res.data), 200
+
+    except Exception as e:
+        return jsonify({
+            "error": "Failed to fetch active batches",
+            "details": str(e)
+        }), 500
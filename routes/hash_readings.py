@@ -1,5 +1,66 @@
 import json
 import hashlib
+import math
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Built once: json.dumps(...) with custom separators builds a new
+# encoder on every call
+_canonical_encoder = json.JSONEncoder(sort_keys=True, separators=(",", ":"))
+
+
+def _orjson_safe(value) -> bool:
+    """
+    True if orjson's output for value is byte-identical to the
+    canonical json encoder: ASCII str keys/strings without DEL (stdlib
+    escapes it, orjson does not), ints within 64 bits, finite floats in
+    the range both print in plain decimal notation.
+
+    Exact type checks: subclasses (numpy scalars, IntEnum, ...) are
+    either rejected by orjson or printed differently, so they take the
+    stdlib path.
+    """
+
+    kind = type(value)
+
+    if value is None or kind is bool:
+        return True
+    if kind is float:
+        if value == 0.0:
+            return True
+        return math.isfinite(value) and 1e-4 <= abs(value) < 1e16
+    if kind is int:
+        return -(1 << 63) <= value < (1 << 64)
+    if kind is str:
+        return _plain_ascii(value)
+    if kind is dict:
+        return all(
+            type(k) is str and _plain_ascii(k) and _orjson_safe(v)
+            for k, v in value.items()
+        )
+    if kind is list or kind is tuple:
+        return all(_orjson_safe(v) for v in value)
+    return False
+
+
+def _plain_ascii(text: str) -> bool:
+    return text.isascii() and "\x7f" not in text
+
+
+def canonical_json(reading) -> bytes:
+    """
+    Sorted keys, no whitespace. orjson when the output is provably
+    identical, stdlib json otherwise.
+    """
+
+    if orjson is not None and _orjson_safe(reading):
+        return orjson.dumps(reading, option=orjson.OPT_SORT_KEYS)
+
+    return _canonical_encoder.encode(reading).encode("utf-8")
+
 
 def hash_reading(reading: dict) -> str:
     """
@@ -9,10 +70,4 @@ def hash_reading(reading: dict) -> str:
     - Safe for Merkle trees & blockchain verification
     """
 
-    normalized = json.dumps(
-        reading,
-        sort_keys=True,
-        separators=(",", ":")
-    )
-
-    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+    return hashlib.sha256(canonical_json(reading)).hexdigest()
@@ -0,0 +1,158 @@
+"""
+HTTP caching helpers for immutable (finalized batch) responses.
+
+- Strong ETags derived from the Merkle root, tx hash and verification
+  outcome, with `Cache-Control: immutable` once the outcome is final
+  (verified and on chain); anything else is `no-cache` and revalidated.
+- Conditional GET: the last ETag served per resource is remembered, so a
+  matching If-None-Match gets a 304 before any database work.
+- Optional gzip / brotli for large JSON bodies (brotli when installed).
+"""
+
+from flask import jsonify, request, make_response
+from collections import OrderedDict
+import threading
+import hashlib
+import gzip
+import os
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+KNOWN_ETAGS_SIZE = int(os.getenv("KNOWN_ETAGS_SIZE", "10000"))
+
+_known_etags = OrderedDict()   # resource key -> last ETag served
+_lock = threading.Lock()
+
+
+def strong_etag(*parts) -> str:
+    digest = hashlib.sha256("|".join(str(p) for p in parts).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def _client_etags():
+    """
+    {base ETag: tag as the client sent it}. Compressed representations
+    carry -gz / -br suffixes; they validate against the base ETag but
+    the 304 must echo the variant the client holds.
+    """
+
+    header = request.headers.get("If-None-Match", "")
+    tags = {}
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if not tag:
+            continue
+        base = tag
+        for suffix in ('-gz"', '-br"'):
+            if tag.endswith(suffix):
+                base = tag[:-len(suffix)] + '"'
+        tags.setdefault(base, tag)
+    return tags
+
+
+def not_modified(etag: str, cache_control: str = IMMUTABLE_CACHE_CONTROL):
+    """
+    304 response for a matching If-None-Match, else None.
+    """
+
+    tags = _client_etags()
+    if etag and (etag in tags or "*" in tags):
+        matched = tags.get(etag, etag)
+        response = make_response("", 304)
+        response.headers["ETag"] = matched
+        response.headers["Cache-Control"] = cache_control
+        if matched != etag:
+            response.vary.add("Accept-Encoding")
+        return response
+    return None
+
+
+def precheck(key):
+    """
+    304 before any DB work if the client already holds the last ETag
+    served for this resource by this process.
+    """
+
+    if "If-None-Match" not in request.headers:
+        return None
+
+    with _lock:
+        etag = _known_etags.get(key)
+
+    return not_modified(etag) if etag else None
+
+
+def immutable_json(key, payload: dict, etag: str, immutable: bool = True):
+    """
+    200 JSON response with strong validator.
+
+    Only a final outcome is marked immutable and remembered for
+    precheck(); otherwise the response is `no-cache`, so clients
+    revalidate with the ETag and a later change is picked up.
+    """
+
+    cache_control = IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL
+
+    with _lock:
+        if immutable:
+            _known_etags[key] = etag
+            _known_etags.move_to_end(key)
+            while len(_known_etags) > KNOWN_ETAGS_SIZE:
+                _known_etags.popitem(last=False)
+        else:
+            _known_etags.pop(key, None)
+
+    response = not_modified(etag, cache_control)
+    if response is not None:
+        return response
+
+    response = jsonify(payload)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
+    return response
+
+
+# =========================================================
+# Response compression (gzip / brotli)
+# =========================================================
+def _compress(response):
+    if response.status_code != 200 or response.direct_passthrough or response.is_streamed:
+        return response
+    if response.mimetype != "application/json" or "Content-Encoding" in response.headers:
+        return response
+
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_BYTES:
+        return response
+
+    accepted = request.headers.get("Accept-Encoding", "").lower()
+
+    if brotli is not None and "br" in accepted:
+        encoding, suffix, data = "br", "-br", brotli.compress(body, quality=5)
+    elif "gzip" in accepted:
+        encoding, suffix, data = "gzip", "-gz", gzip.compress(body, compresslevel=6)
+    else:
+        return response
+
+    response.set_data(data)
+    response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+
+    # Each encoding is a distinct representation for a strong ETag
+    etag = response.headers.get("ETag")
+    if etag and etag.endswith('"'):
+        response.headers["ETag"] = etag[:-1] + suffix + '"'
+
+    return response
+
+
+def init_app(app):
+    app.after_request(_compress)
@@ -0,0 +1,660 @@
+"""
+Write-ahead spool for sensor ingest.
+
+Ingest appends harvest_data rows to a local, segmented, append-only
+JSONL log and returns once the write is durable. A background replicator
+ships the log to Supabase in bulk, so a slow or unreachable database
+no longer turns into a 500 (and a lost reading) or a worker blocked for
+the full HTTP timeout.
+
+    SPOOL_DIR/<pid>-<id>/LOCK              flock held while the process lives
+    SPOOL_DIR/<pid>-<id>/seg-00000001.jsonl
+    SPOOL_DIR/<pid>-<id>/checkpoint.json   {"segment": n, "offset": bytes}
+    SPOOL_DIR/dead_letter.jsonl            rows the database rejected
+    SPOOL_DIR/parked.jsonl                 rows whose farm has no ACTIVE batch
+
+- Durability: concurrent appends share one fsync (group commit).
+- Ordering: one replicator per spool ships lines in append order; rows
+  carry an explicit created_at, so per-batch order survives retries.
+- Crash recovery: replay restarts at the checkpoint. Every row has an
+  idempotency_key, so re-shipping is a no-op. Spools whose owner died
+  (LOCK no longer held) are adopted and drained by a live process.
+- Rows of a batch finalized while they sat in the spool are rejected by
+  the database and re-routed, farm by farm, to the farm's current ACTIVE
+  batch. Rows of a farm with none are parked and retried every
+  SPOOL_PARK_RETRY_SECONDS; the rest of the chunk ships.
+- Poison rows: rows that cannot be encoded (NaN / Infinity) go straight
+  to the dead-letter file. When PostgREST rejects a chunk with a data
+  error (SQLSTATE 22 / 23), the chunk is split until the bad row is
+  alone; that row is dead-lettered and the checkpoint moves past it.
+  Every other failure is retried with backoff; auth / schema / config
+  errors also raise an alert (status["alert"], spool_alert gauge).
+"""
+
+from supabase import create_client
+from postgrest.exceptions import APIError
+from datetime import datetime
+import threading
+import atexit
+import fcntl
+import json
+import time
+import uuid
+import os
+
+from routes.metrics import gauge, instrument_supabase
+from routes.farm_routing import batch_closed, reroute
+from routes.offload import offload
+
+# -------------------------------
+# Supabase Configuration
+# -------------------------------
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+supabase = instrument_supabase(create_client(SUPABASE_URL, SUPABASE_KEY))
+
+SPOOL_ENABLED = os.getenv("SPOOL_ENABLED", "1") == "1"
+SPOOL_DIR = os.getenv("SPOOL_DIR", "spool")
+SPOOL_SEGMENT_BYTES = int(os.getenv("SPOOL_SEGMENT_BYTES", str(4 * 1024 * 1024)))
+SPOOL_FSYNC = os.getenv("SPOOL_FSYNC", "1") == "1"
+SPOOL_BATCH_ROWS = int(os.getenv("SPOOL_BATCH_ROWS", "500"))
+SPOOL_POLL_SECONDS = float(os.getenv("SPOOL_POLL_SECONDS", "0.2"))
+SPOOL_MAX_BACKOFF = float(os.getenv("SPOOL_MAX_BACKOFF", "30"))
+SPOOL_DRAIN_TIMEOUT = float(os.getenv("SPOOL_DRAIN_TIMEOUT", "30"))
+SPOOL_PARK_RETRY = float(os.getenv("SPOOL_PARK_RETRY_SECONDS", "30"))
+
+CHECKPOINT = "checkpoint.json"
+LOCK = "LOCK"
+DEAD_LETTER = "dead_letter.jsonl"
+PARKED = "parked.jsonl"
+
+# Only data errors condemn a row: SQLSTATE 22 (data exception) and
+# 23 (integrity constraint violation)
+REJECT_CODES = ("22", "23")
+# Retried like any other failure, but no retry will fix them without an
+# operator: auth (28, 42501), schema (42P01, PGRST204), JWT / config
+ALERT_CODES = ("28", "42", "PGRST1", "PGRST2", "PGRST3")
+
+status = {
+    "replicated_rows": 0,
+    "duplicate_rows": 0,
+    "failures": 0,
+    "last_error": None,
+    "last_replicated_at": None,
+    "lag_seconds": 0.0,
+    "adopted_spools": 0,
+    "dead_letter_rows": 0,
+    "parked_rows": 0,
+    "alert": None
+}
+
+_writer = None
+_handler = None
+_wake = threading.Event()
+_replicate_lock = threading.Lock()
+_last_park_retry = 0.0
+
+
+# =========================================================
+# Segment / checkpoint files
+# =========================================================
+def _segment_name(number: int) -> str:
+    return f"seg-{number:08d}.jsonl"
+
+
+def _segments(path):
+    try:
+        names = os.listdir(path)
+    except FileNotFoundError:
+        return []
+    return sorted(
+        (int(name[4:12]), name)
+        for name in names
+        if name.startswith("seg-") and name.endswith(".jsonl")
+    )
+
+
+def _read_checkpoint(path):
+    try:
+        with open(os.path.join(path, CHECKPOINT)) as f:
+            data = json.load(f)
+        return data["segment"], data["offset"]
+    except (FileNotFoundError, ValueError, KeyError):
+        return 0, 0
+
+
+def _write_checkpoint(path, segment: int, offset: int) -> None:
+    tmp = os.path.join(path, CHECKPOINT + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump({"segment": segment, "offset": offset}, f)
+        f.flush()
+        offload(os.fsync, f.fileno())
+    os.replace(tmp, os.path.join(path, CHECKPOINT))
+
+
+def _pending_lines(path, live_segment=None):
+    """
+    Yield (segment, end_offset, line) for every complete line after the
+    checkpoint. A torn last line of a sealed segment (writer died mid-
+    append, before acknowledging) is skipped.
+    """
+
+    checkpoint_segment, checkpoint_offset = _read_checkpoint(path)
+
+    for number, name in _segments(path):
+        if number < checkpoint_segment:
+            continue
+
+        offset = checkpoint_offset if number == checkpoint_segment else 0
+        try:
+            f = open(os.path.join(path, name), "rb")
+        except FileNotFoundError:
+            continue
+
+        with f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                offset += len(line)
+                yield number, offset, line
+
+        if live_segment is not None and number >= live_segment:
+            return
+
+
+# =========================================================
+# Writer: append-only segments, group fsync
+# =========================================================
+class SpoolWriter:
+    def __init__(self, root):
+        name = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.path = os.path.join(root, name)
+
+        # Lock before the directory becomes visible, or another
+        # process could adopt it as an orphan
+        staging = os.path.join(root, "." + name)
+        os.makedirs(staging)
+        self._lock_fd = os.open(os.path.join(staging, LOCK), os.O_CREAT | os.O_RDWR, 0o644)
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        os.rename(staging, self.path)
+
+        self._cond = threading.Condition()
+        self._fd = None
+        self.segment = 0
+        self._size = 0
+        self._written = 0    # appends issued
+        self._durable = 0    # appends covered by an fsync
+        self._syncing = False
+        self._roll()
+
+    def _roll(self):
+        if self._fd is not None:
+            if SPOOL_FSYNC:
+                offload(os.fsync, self._fd)
+            os.close(self._fd)
+            self._durable = self._written
+
+        self.segment += 1
+        self._fd = os.open(
+            os.path.join(self.path, _segment_name(self.segment)),
+            os.O_CREAT | os.O_WRONLY | os.O_APPEND,
+            0o644
+        )
+        self._size = 0
+
+    def append(self, rows) -> None:
+        now = time.time()
+        data = b"".join(
+            json.dumps({"t": now, "row": row}, separators=(",", ":"), default=str).encode() + b"\n"
+            for row in rows
+        )
+
+        with self._cond:
+            if self._size and self._size + len(data) > SPOOL_SEGMENT_BYTES:
+                self._roll()
+
+            view = memoryview(data)
+            while view:
+                view = view[os.write(self._fd, view):]
+
+            self._size += len(data)
+            self._written += 1
+            ticket = self._written
+
+        if SPOOL_FSYNC:
+            self._sync(ticket)
+
+        _wake.set()
+
+    def _sync(self, ticket):
+        """
+        Group commit: one caller fsyncs on behalf of every append
+        issued so far; the others wait for it.
+        """
+
+        with self._cond:
+            while self._durable < ticket:
+                if self._syncing:
+                    self._cond.wait()
+                    continue
+
+                self._syncing = True
+                target = self._written
+                # dup: a concurrent roll may close the original fd
+                fd = os.dup(self._fd)
+                self._cond.release()
+                synced = False
+                try:
+                    # Real thread under gevent: the hub keeps serving
+                    # (and queueing appends for the next group commit)
+                    offload(os.fsync, fd)
+                    synced = True
+                finally:
+                    os.close(fd)
+                    self._cond.acquire()
+                    self._syncing = False
+                    if synced:
+                        self._durable = max(self._durable, target)
+                    self._cond.notify_all()
+
+    def pending_bytes(self) -> int:
+        checkpoint_segment, checkpoint_offset = _read_checkpoint(self.path)
+        total = 0
+        for number, name in _segments(self.path):
+            try:
+                size = os.path.getsize(os.path.join(self.path, name))
+            except FileNotFoundError:
+                continue
+            if number == checkpoint_segment:
+                size -= checkpoint_offset
+            if number >= checkpoint_segment:
+                total += size
+        return total
+
+
+# =========================================================
+# Replicator: spool → harvest_data (bulk, in order)
+# =========================================================
+def _upsert(rows):
+    return supabase.table("harvest_data").upsert(
+        rows,
+        on_conflict="idempotency_key",
+        ignore_duplicates=True
+    ).execute()
+
+
+def _upsert_routed(rows):
+    """
+    Upsert, re-routed once if a batch was finalized meanwhile.
+    Returns (result or None, rows left out: their farm has no ACTIVE
+    batch).
+    """
+
+    try:
+        return _upsert(rows), []
+    except Exception as e:
+        if not batch_closed(e):
+            raise
+
+    stranded = reroute(rows)
+    if stranded:
+        left_out = {id(row) for row in stranded}
+        rows = [row for row in rows if id(row) not in left_out]
+
+    return (_upsert(rows) if rows else None), stranded
+
+
+def _rejected(error) -> bool:
+    """
+    True if the database refused the rows themselves (a data error),
+    so retrying the same chunk can never succeed.
+    """
+
+    if not isinstance(error, APIError) or batch_closed(error):
+        return False
+
+    return str(error.code or "").startswith(REJECT_CODES)
+
+
+def _needs_operator(error) -> bool:
+    return isinstance(error, APIError) and str(error.code or "").startswith(ALERT_CODES)
+
+
+def _unencodable(row):
+    """
+    The error if the row cannot be sent as JSON (httpx refuses NaN /
+    Infinity), else None.
+    """
+
+    try:
+        json.dumps(row, allow_nan=False)
+    except (TypeError, ValueError) as e:
+        return e
+    return None
+
+
+def _dead_letter(record, error) -> None:
+    entry = {
+        "t": record["t"],
+        "row": record["row"],
+        "error": str(error),
+        "at": datetime.utcnow().isoformat()
+    }
+
+    with open(os.path.join(SPOOL_DIR, DEAD_LETTER), "a") as f:
+        f.write(json.dumps(entry, separators=(",", ":"), default=str) + "\n")
+        f.flush()
+        offload(os.fsync, f.fileno())
+
+    status["dead_letter_rows"] += 1
+    print("☠️ Spool row dead-lettered:", record["row"].get("idempotency_key"), error)
+
+
+def _park(records) -> None:
+    if not records:
+        return
+
+    data = "".join(json.dumps(r, separators=(",", ":"), default=str) + "\n" for r in records)
+
+    with open(os.path.join(SPOOL_DIR, PARKED), "a") as f:
+        # Excludes a concurrent _retry_parked() rewrite (any process)
+        fcntl.flock(f, fcntl.LOCK_EX)
+        f.write(data)
+        f.flush()
+        offload(os.fsync, f.fileno())
+
+    status["parked_rows"] += len(records)
+    print("🅿️ Spool rows parked (farm has no ACTIVE batch):", len(records))
+
+
+def _retry_parked() -> None:
+    """
+    Re-ship parked rows whose farm has an ACTIVE batch again; the rest
+    stay parked. At most every SPOOL_PARK_RETRY seconds, one process at
+    a time.
+    """
+
+    global _last_park_retry
+
+    if time.time() - _last_park_retry < SPOOL_PARK_RETRY:
+        return
+    _last_park_retry = time.time()
+
+    try:
+        f = open(os.path.join(SPOOL_DIR, PARKED), "r+")
+    except FileNotFoundError:
+        return
+
+    with f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return   # another process is retrying
+
+        records = [json.loads(line) for line in f if line.endswith("\n")]
+        if not records:
+            return
+
+        # Raises on a transient failure: the file is left as it was
+        parked = _ship(records)
+
+        f.seek(0)
+        f.truncate()
+        f.write("".join(json.dumps(r, separators=(",", ":"), default=str) + "\n" for r in parked))
+        f.flush()
+        offload(os.fsync, f.fileno())
+
+    status["parked_rows"] = len(parked)
+    if len(parked) < len(records):
+        print("🚚 Parked spool rows shipped:", len(records) - len(parked))
+
+
+def _ship(records) -> list:
+    """
+    Ship records in order. Returns the records left out because their
+    farm has no ACTIVE batch (for the caller to park).
+    """
+
+    rows = [r["row"] for r in records]
+    try:
+        res, stranded = _upsert_routed(rows)
+    except Exception as e:
+        if not _rejected(e):
+            raise
+
+        if len(records) == 1:
+            _dead_letter(records[0], e)
+            return []
+
+        # Bisect until the bad row is alone; the rest still ship in order
+        middle = len(records) // 2
+        return _ship(records[:middle]) + _ship(records[middle:])
+
+    left_out = {id(row) for row in stranded}
+    parked = [r for r in records if id(r["row"]) in left_out]
+
+    if res is None:
+        return parked
+
+    status["replicated_rows"] += len(res.data)
+    status["duplicate_rows"] += len(rows) - len(stranded) - len(res.data)
+    status["lag_seconds"] = round(time.time() - records[0]["t"], 3)
+    status["last_replicated_at"] = datetime.utcnow().isoformat()
+
+    if _handler and res.data:
+        try:
+            _handler(res.data)
+        except Exception as e:
+            print("⚠️ Spool replicated-rows hook failed:", e)
+
+    return parked
+
+
+def _replicate(path, live_segment=None) -> int:
+    """
+    Ship everything after the checkpoint. Returns rows shipped.
+    Raises (leaving the checkpoint untouched) on a transient failure;
+    rejected rows are dead-lettered and parked rows set aside, neither
+    stops the checkpoint.
+    """
+
+    shipped = 0
+    batch, position = [], None
+
+    for number, offset, line in _pending_lines(path, live_segment):
+        record = json.loads(line)
+        position = (number, offset)
+
+        error = _unencodable(record["row"])
+        if error is not None:
+            _dead_letter(record, error)
+        else:
+            batch.append(record)
+
+        if len(batch) >= SPOOL_BATCH_ROWS:
+            _park(_ship(batch))
+            _write_checkpoint(path, *position)
+            shipped += len(batch)
+            batch, position = [], None
+
+    if batch:
+        _park(_ship(batch))
+        shipped += len(batch)
+    if position is not None:
+        _write_checkpoint(path, *position)
+
+    # Sealed segments fully behind the checkpoint can go
+    checkpoint_segment, _ = _read_checkpoint(path)
+    for number, name in _segments(path):
+        if live_segment is None or number < checkpoint_segment:
+            os.remove(os.path.join(path, name))
+
+    if shipped == 0 and live_segment is not None:
+        status["lag_seconds"] = 0.0
+
+    return shipped
+
+
+def _adopt_orphans():
+    """
+    Drain spools left behind by dead processes.
+    """
+
+    try:
+        names = os.listdir(SPOOL_DIR)
+    except FileNotFoundError:
+        return
+
+    for name in names:
+        path = os.path.join(SPOOL_DIR, name)
+        if name.startswith(".") or path == _writer.path or not os.path.isdir(path):
+            continue
+
+        try:
+            fd = os.open(os.path.join(path, LOCK), os.O_CREAT | os.O_RDWR, 0o644)
+        except OSError:
+            continue
+
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            continue   # owner still alive
+
+        try:
+            shipped = _replicate(path)
+            for leftover in os.listdir(path):
+                os.remove(os.path.join(path, leftover))
+            os.rmdir(path)
+            status["adopted_spools"] += 1
+            print("♻️ Adopted orphan spool:", name, "rows:", shipped)
+        finally:
+            os.close(fd)
+
+
+def replicate_once() -> int:
+    with _replicate_lock:
+        shipped = _replicate(_writer.path, _writer.segment)
+        _adopt_orphans()
+        _retry_parked()
+        return shipped
+
+
+def _loop():
+    delay = SPOOL_POLL_SECONDS
+    while True:
+        _wake.wait(delay)
+        _wake.clear()
+        try:
+            replicate_once()
+            delay = SPOOL_POLL_SECONDS
+            status["alert"] = None
+        except Exception as e:
+            status["failures"] += 1
+            status["last_error"] = str(e)
+            delay = min(max(delay, SPOOL_POLL_SECONDS) * 2, SPOOL_MAX_BACKOFF)
+            if _needs_operator(e):
+                status["alert"] = str(e)
+                print("🚨 Spool replication blocked (auth / schema / config), retry in", delay, "s:", e)
+            else:
+                print("⚠️ Spool replication failed, retry in", delay, "s:", e)
+
+
+def _drain_at_exit():
+    try:
+        replicate_once()
+    except Exception as e:
+        print("⚠️ Spool not drained at exit (kept on disk):", e)
+
+
+# =========================================================
+# Public API
+# =========================================================
+def set_replicated_handler(fn) -> None:
+    """
+    fn(rows) runs in the replicator for rows actually inserted
+    (duplicates already dropped by the unique index).
+    """
+
+    global _handler
+    _handler = fn
+
+
+def start() -> None:
+    global _writer
+    if _writer is not None or not SPOOL_ENABLED:
+        return
+
+    _writer = SpoolWriter(SPOOL_DIR)
+    threading.Thread(target=_loop, name="spool-replicator", daemon=True).start()
+    atexit.register(_drain_at_exit)
+    _wake.set()   # pick up orphans straight away
+    print("🧾 Ingest spool:", _writer.path)
+
+
+def active() -> bool:
+    return _writer is not None
+
+
+def append(rows) -> None:
+    _writer.append(rows)
+
+
+def pending_for_batch(batch_id: str) -> int:
+    """
+    Unreplicated rows of this batch across every spool on this host.
+    """
+
+    needle = json.dumps(batch_id).encode()
+    count = 0
+
+    try:
+        names = os.listdir(SPOOL_DIR)
+    except FileNotFoundError:
+        return 0
+
+    for name in names:
+        path = os.path.join(SPOOL_DIR, name)
+        if not os.path.isdir(path):
+            continue
+        for _, _, line in _pending_lines(path):
+            if needle in line and json.loads(line)["row"].get("batch_id") == batch_id:
+                count += 1
+
+    return count
+
+
+def wait_drained(batch_id: str, timeout: float = SPOOL_DRAIN_TIMEOUT) -> None:
+    """
+    Block until every spooled reading of batch_id is in harvest_data.
+    """
+
+    if not os.path.isdir(SPOOL_DIR):
+        return
+
+    deadline = time.time() + timeout
+    while True:
+        pending = pending_for_batch(batch_id)
+        if pending == 0:
+            return
+        if time.time() >= deadline:
+            raise Exception(f"Ingest spool not drained: {pending} readings of {batch_id} pending")
+        _wake.set()
+        time.sleep(SPOOL_POLL_SECONDS)
+
+
+gauge("spool_pending_bytes", "Spooled bytes not yet in Supabase",
+      lambda: _writer.pending_bytes() if _writer else 0)
+gauge("spool_segments", "Spool segment files on disk",
+      lambda: len(_segments(_writer.path)) if _writer else 0)
+gauge("spool_replication_lag_seconds", "Age of the oldest reading in the last shipped chunk",
+      lambda: status["lag_seconds"])
+gauge("spool_replicated_rows_total", "Rows shipped from the spool", lambda: status["replicated_rows"])
+gauge("spool_replication_failures_total", "Failed spool shipments", lambda: status["failures"])
+gauge("spool_dead_letter_rows_total", "Spooled rows rejected by the database",
+      lambda: status["dead_letter_rows"])
+gauge("spool_parked_rows", "Spooled rows waiting for their farm's next ACTIVE batch",
+      lambda: status["parked_rows"])
+gauge("spool_alert", "1 while replication is blocked by an auth / schema / config error",
+      lambda: int(status["alert"] is not None))
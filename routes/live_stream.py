@@ -0,0 +1,216 @@
+"""
+In-process fan-out hub for live sensor readings (Server-Sent Events).
+
+The ingest path publishes each stored reading once; every SSE subscriber
+of that batch (and of the "*" all-batches topic) is woken from a
+per-topic condition, so one event source serves any number of clients.
+Each topic keeps a short replay buffer for Last-Event-ID resume and the
+latest payload for plain GET /latest requests. That payload is only
+served for LATEST_TTL seconds (other workers may have newer readings)
+and is dropped when its batch is finalized.
+
+Event ids are "<epoch>-<n>", epoch being random per process: a cursor
+from another worker or from before a restart cannot match, so the
+client gets the whole replay buffer instead of silently missing events.
+Batch topics without subscribers are dropped after SSE_TOPIC_IDLE
+seconds without events (and on finalize).
+
+The hub is per process: stream and ingest must be served by the same
+worker process.
+"""
+
+from collections import deque
+import threading
+import json
+import time
+import uuid
+import os
+
+from routes.metrics import gauge
+
+ALL_TOPIC = "*"
+
+HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+REPLAY_SIZE = int(os.getenv("SSE_REPLAY_SIZE", "256"))
+MAX_SUBSCRIBERS = int(os.getenv("SSE_MAX_SUBSCRIBERS", "5000"))
+LATEST_TTL = float(os.getenv("LIVE_LATEST_TTL", "2"))
+TOPIC_IDLE_SECONDS = float(os.getenv("SSE_TOPIC_IDLE", "60"))
+
+
+class _Topic:
+    __slots__ = ("cond", "events", "latest", "latest_at", "subscribers")
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.events = deque(maxlen=REPLAY_SIZE)   # (n, payload)
+        self.latest = None
+        self.latest_at = time.monotonic()
+        self.subscribers = 0
+
+
+class _Subscription:
+    """
+    SSE body. The subscriber slot is taken when created and released
+    by close(), which the WSGI server calls even if the body was never
+    iterated.
+    """
+
+    def __init__(self, hub, topic, cursor):
+        self._hub = hub
+        self._topic = topic
+        self._cursor = cursor
+        self._closed = False
+
+    def __iter__(self):
+        return self._hub._frames(self._topic, self._cursor)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._hub._release(self._topic)
+
+
+class LiveHub:
+    def __init__(self):
+        self._topics = {}
+        self._lock = threading.Lock()
+        self._epoch = uuid.uuid4().hex[:8]
+        self._next_id = 0
+        self._swept_at = time.monotonic()
+        self.subscribers = 0
+
+    def _topic(self, name: str) -> _Topic:
+        topic = self._topics.get(name)
+        if topic is None:
+            with self._lock:
+                topic = self._topics.setdefault(name, _Topic())
+        return topic
+
+    def _sweep(self, now: float) -> None:
+        if now - self._swept_at < TOPIC_IDLE_SECONDS:
+            return
+
+        with self._lock:
+            self._swept_at = now
+            for name, topic in list(self._topics.items()):
+                if name != ALL_TOPIC and not topic.subscribers \
+                        and now - topic.latest_at > TOPIC_IDLE_SECONDS:
+                    del self._topics[name]
+
+    def cursor(self, last_event_id) -> int:
+        """
+        Position in this process's event sequence for a Last-Event-ID.
+        Ids from another process / an earlier run (or ahead of this
+        one) replay the whole buffer. Raises ValueError if malformed.
+        """
+
+        if not last_event_id:
+            return 0
+
+        epoch, _, n = str(last_event_id).rpartition("-")
+        n = int(n)
+        if epoch != self._epoch or n > self._next_id:
+            return 0
+        return n
+
+    # -----------------------------
+    # Producer side (ingest path)
+    # -----------------------------
+    def publish(self, batch_id: str, payload: dict) -> str:
+        with self._lock:
+            self._next_id += 1
+            n = self._next_id
+
+        now = time.monotonic()
+
+        for name in (batch_id, ALL_TOPIC):
+            topic = self._topic(name)
+            with topic.cond:
+                topic.events.append((n, payload))
+                topic.latest = payload
+                topic.latest_at = now
+                topic.cond.notify_all()
+
+        self._sweep(now)
+        return f"{self._epoch}-{n}"
+
+    def latest(self, batch_id: str = ALL_TOPIC):
+        topic = self._topics.get(batch_id)
+        if topic is None or time.monotonic() - topic.latest_at > LATEST_TTL:
+            return None
+        return topic.latest
+
+    def forget(self, batch_id: str) -> None:
+        """
+        Drop cached latest payloads of a batch (e.g. on finalize,
+        when merkle_root / blockchain_tx stop being PENDING).
+        """
+
+        for name in (batch_id, ALL_TOPIC):
+            topic = self._topics.get(name)
+            if topic is None:
+                continue
+            with topic.cond:
+                if topic.latest and topic.latest.get("batch_id") == batch_id:
+                    topic.latest = None
+                    topic.latest_at = 0.0
+
+        # The batch gets no more readings; keep its topic only while watched
+        with self._lock:
+            topic = self._topics.get(batch_id)
+            if topic is not None and not topic.subscribers:
+                del self._topics[batch_id]
+
+    # -----------------------------
+    # Consumer side (SSE response)
+    # -----------------------------
+    def stream(self, batch_id: str = ALL_TOPIC, last_event_id=None):
+        """
+        SSE body. Replays buffered events after last_event_id, then
+        blocks for new ones, sending a comment heartbeat when idle so
+        proxies keep the connection open. The caller checks that
+        batch_id is a real batch.
+        """
+
+        cursor = self.cursor(last_event_id)
+
+        with self._lock:
+            if self.subscribers >= MAX_SUBSCRIBERS:
+                raise RuntimeError("Too many live subscribers")
+            topic = self._topics.setdefault(batch_id, _Topic())
+            topic.subscribers += 1
+            self.subscribers += 1
+
+        return _Subscription(self, topic, cursor)
+
+    def _release(self, topic: _Topic) -> None:
+        with self._lock:
+            topic.subscribers -= 1
+            self.subscribers -= 1
+
+    def _frames(self, topic: _Topic, cursor: int):
+        yield "retry: 3000\n\n"
+
+        while True:
+            with topic.cond:
+                pending = [e for e in topic.events if e[0] > cursor]
+                if not pending:
+                    topic.cond.wait(HEARTBEAT_SECONDS)
+                    pending = [e for e in topic.events if e[0] > cursor]
+
+            if not pending:
+                yield ": heartbeat\n\n"
+                continue
+
+            for n, payload in pending:
+                cursor = n
+                yield (
+                    f"id: {self._epoch}-{n}\n"
+                    f"event: reading\n"
+                    f"data: {json.dumps(payload, separators=(',', ':'))}\n\n"
+                )
+
+
+hub = LiveHub()
+
+gauge("sse_subscribers", "Open live stream subscribers", lambda: hub.subscribers)
@@ -1,5 +1,7 @@
 import hashlib
 
+from routes.hash_readings import hash_reading
+
 def merkle_root(hashes):
     if len(hashes) == 1:
         return hashes[0]
@@ -13,3 +15,13 @@ def merkle_root(hashes):
         new_level.append(new_hash)
 
     return merkle_root(new_level)
+
+
+def leaves_and_root(readings):
+    """
+    Leaf hashes and Merkle root of a batch, in one call (so it can be
+    offloaded as a unit).
+    """
+
+    hashes = [hash_reading(r) for r in readings]
+    return hashes, merkle_root(hashes)
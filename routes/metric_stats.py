@@ -0,0 +1,112 @@
+import math
+
+# ---------------------------------
+# Metrics tracked per reading
+# ---------------------------------
+METRICS = ("airTemp", "humidity", "soilMoisture", "soilPH", "N", "P", "K")
+
+
+def _to_number(value):
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+def extract_metrics(reading: dict) -> dict:
+    """
+    Flatten a canonical sensor reading into {metric: float}.
+    Missing / non-numeric values are skipped.
+    npk may be a dict ({"N":..,"P":..,"K":..}) or "N-P-K" string.
+    """
+
+    values = {}
+
+    for key in ("airTemp", "humidity", "soilMoisture", "soilPH"):
+        number = _to_number(reading.get(key))
+        if number is not None:
+            values[key] = number
+
+    npk = reading.get("npk")
+    if isinstance(npk, str):
+        parts = npk.split("-")
+        npk = dict(zip(("N", "P", "K"), parts)) if len(parts) == 3 else None
+
+    if isinstance(npk, dict):
+        for key in ("N", "P", "K"):
+            number = _to_number(npk.get(key))
+            if number is not None:
+                values[key] = number
+
+    return values
+
+
+# ---------------------------------
+# Running aggregates (count/sum/sumsq/min/max/last)
+# ---------------------------------
+def empty_stats() -> dict:
+    return {
+        "count": 0,
+        "sum": 0.0,
+        "sumsq": 0.0,
+        "min": None,
+        "max": None,
+        "last": None
+    }
+
+
+def add_value(stats: dict, value: float) -> None:
+    stats["count"] += 1
+    stats["sum"] += value
+    stats["sumsq"] += value * value
+    stats["min"] = value if stats["min"] is None else min(stats["min"], value)
+    stats["max"] = value if stats["max"] is None else max(stats["max"], value)
+    stats["last"] = value
+
+
+def add_reading(stats_by_metric: dict, reading: dict) -> None:
+    for metric, value in extract_metrics(reading).items():
+        add_value(stats_by_metric.setdefault(metric, empty_stats()), value)
+
+
+def merge_stats(into: dict, other: dict) -> None:
+    """
+    Fold stats_by_metric `other` into `into` (other is the newer side).
+    Mirrors the merge_stats() SQL function used for atomic upserts.
+    """
+
+    for metric, stats in other.items():
+        target = into.get(metric)
+        if target is None:
+            into[metric] = dict(stats)
+            continue
+
+        target["count"] += stats["count"]
+        target["sum"] += stats["sum"]
+        target["sumsq"] += stats["sumsq"]
+        for key, pick in (("min", min), ("max", max)):
+            values = [v for v in (target[key], stats[key]) if v is not None]
+            target[key] = pick(values) if values else None
+        target["last"] = stats["last"]
+
+
+def describe(stats: dict) -> dict:
+    """
+    Public view of one metric: adds mean / stddev derived in O(1).
+    """
+
+    count = stats["count"]
+    if not count:
+        return {**stats, "mean": None, "stddev": None}
+
+    mean = stats["sum"] / count
+    variance = max(stats["sumsq"] / count - mean * mean, 0.0)
+
+    return {
+        **stats,
+        "mean": round(mean, 4),
+        "stddev": round(math.sqrt(variance), 4)
+    }
@@ -0,0 +1,348 @@
+"""
+Prometheus-style metrics and sampled request tracing.
+
+    GET /metrics          Prometheus text exposition
+    GET /metrics/traces   most recent sampled traces (JSON)
+
+Histograms are always recorded (a lock + a few adds). Spans are only
+built for sampled requests (TRACE_SAMPLE_RATE, default 1%), so the
+unsampled hot path pays one ContextVar lookup per span.
+"""
+
+from flask import Blueprint, Response, jsonify, request, g
+from contextlib import contextmanager
+from contextvars import ContextVar
+from collections import deque
+import threading
+import random
+import bisect
+import time
+import uuid
+import os
+
+metrics_bp = Blueprint("metrics", __name__)
+
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))
+TRACE_BUFFER = int(os.getenv("TRACE_BUFFER", "200"))
+
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+
+# =========================================================
+# Metric types
+# =========================================================
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {}   # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(l, "")) for l in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+
+        for key, series in items:
+            base = ",".join(f'{l}="{v}"' for l, v in zip(self.labels, key))
+            sep = "," if base else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{base}{sep}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{base}{sep}le="+Inf"}} {series[-1]}')
+            lines.append(f"{self.name}_sum{{{base}}} {series[-2]}")
+            lines.append(f"{self.name}_count{{{base}}} {series[-1]}")
+
+        return lines
+
+
+class Gauge:
+    """
+    Read at scrape time from a callback (queue depths, subscribers).
+    """
+
+    def __init__(self, name, help_text, fn):
+        self.name = name
+        self.help = help_text
+        self.fn = fn
+
+    def render(self):
+        try:
+            value = float(self.fn())
+        except Exception:
+            value = float("nan")
+        return [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} gauge",
+            f"{self.name} {value}"
+        ]
+
+
+_registry = []
+
+
+def histogram(name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+    metric = Histogram(name, help_text, labels, buckets)
+    _registry.append(metric)
+    return metric
+
+
+def gauge(name, help_text, fn):
+    metric = Gauge(name, help_text, fn)
+    _registry.append(metric)
+    return metric
+
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# =========================================================
+# Core metrics
+# =========================================================
+HTTP_LATENCY = histogram(
+    "http_request_duration_seconds", "HTTP request latency by route",
+    labels=("route", "method", "status")
+)
+SUPABASE_LATENCY = histogram(
+    "supabase_request_duration_seconds", "Supabase (PostgREST) call latency",
+    labels=("table", "op")
+)
+RPC_LATENCY = histogram(
+    "rpc_request_duration_seconds", "Ethereum JSON-RPC call latency",
+    labels=("method",)
+)
+MERKLE_LATENCY = histogram(
+    "merkle_compute_seconds", "Leaf hashing + Merkle root time by batch size",
+    labels=("size",)
+)
+MODEL_LATENCY = histogram(
+    "model_inference_seconds", "ML model inference time",
+    labels=("model",)
+)
+
+
+def size_bucket(n: int) -> str:
+    for bound in (100, 1000, 10000, 100000):
+        if n <= bound:
+            return f"le_{bound}"
+    return "gt_100000"
+
+
+# =========================================================
+# Tracing (sampled spans, contextvar-propagated)
+# =========================================================
+_current_span = ContextVar("current_span", default=None)
+_recent_traces = deque(maxlen=TRACE_BUFFER)
+
+
+class Span:
+    __slots__ = ("trace_id", "name", "attrs", "start", "duration", "children")
+
+    def __init__(self, trace_id, name, attrs):
+        self.trace_id = trace_id
+        self.name = name
+        self.attrs = attrs
+        self.start = time.time()
+        self.duration = None
+        self.children = []
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "attrs": self.attrs,
+            "start": self.start,
+            "duration_ms": round((self.duration or 0) * 1000, 3),
+            "children": [c.to_dict() for c in self.children]
+        }
+
+
+def current_trace_id():
+    span = _current_span.get()
+    return span.trace_id if span else None
+
+
+@contextmanager
+def span(name, **attrs):
+    """
+    Child span of the current sampled trace; no-op otherwise.
+    """
+
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+
+    child = Span(parent.trace_id, name, attrs)
+    parent.children.append(child)
+    token = _current_span.set(child)
+    started = time.perf_counter()
+    try:
+        yield child
+    finally:
+        child.duration = time.perf_counter() - started
+        _current_span.reset(token)
+
+
+# =========================================================
+# Instrumentation helpers
+# =========================================================
+_WRITE_OPS = ("insert", "update", "upsert", "delete")
+
+
+class _TimedQuery:
+    __slots__ = ("_query", "_table", "_op")
+
+    def __init__(self, query, table, op="select"):
+        self._query = query
+        self._table = table
+        self._op = op
+
+    def __getattr__(self, name):
+        if name == "execute":
+            return self._execute
+
+        attr = getattr(self._query, name)
+        op = name if name in _WRITE_OPS else self._op
+
+        if not callable(attr):
+            return _TimedQuery(attr, self._table, op) if hasattr(attr, "execute") else attr
+
+        def chained(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            return _TimedQuery(result, self._table, op) if hasattr(result, "execute") else result
+
+        return chained
+
+    def _execute(self):
+        with span("supabase", table=self._table, op=self._op):
+            with SUPABASE_LATENCY.time(table=self._table, op=self._op):
+                return self._query.execute()
+
+
+def instrument_supabase(client):
+    """
+    Time every query built from client.table(...) / client.rpc(...)
+    per table (or function) / operation.
+    """
+
+    if getattr(client, "_metrics_instrumented", False):
+        return client
+
+    table = client.table
+
+    def timed_table(name):
+        return _TimedQuery(table(name), name)
+
+    client.table = timed_table
+
+    rpc = getattr(client, "rpc", None)
+    if rpc is not None:
+        client.rpc = lambda fn, params=None, **kwargs: _TimedQuery(
+            rpc(fn, params or {}, **kwargs), fn, "rpc"
+        )
+    client._metrics_instrumented = True
+    return client
+
+
+def instrument_web3(w3):
+    """
+    Time every JSON-RPC call made through this Web3 instance's provider.
+    """
+
+    provider = w3.provider
+    make_request = provider.make_request
+
+    def timed_make_request(method, params):
+        with span("rpc", method=str(method)):
+            with RPC_LATENCY.time(method=str(method)):
+                return make_request(method, params)
+
+    provider.make_request = timed_make_request
+    return w3
+
+
+# =========================================================
+# Flask wiring
+# =========================================================
+def init_app(app):
+    @app.before_request
+    def _start_request():
+        g.metrics_start = time.perf_counter()
+
+        root = None
+        if random.random() < TRACE_SAMPLE_RATE:
+            root = Span(uuid.uuid4().hex, "http", {
+                "method": request.method,
+                "path": request.path
+            })
+            g.trace_root = root
+
+        # Always (re)set so a previous request on this thread never leaks
+        _current_span.set(root)
+
+    @app.after_request
+    def _finish_request(response):
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        elapsed = time.perf_counter() - g.get("metrics_start", time.perf_counter())
+
+        HTTP_LATENCY.observe(
+            elapsed,
+            route=route,
+            method=request.method,
+            status=response.status_code
+        )
+
+        root = g.pop("trace_root", None)
+        if root is not None:
+            root.duration = elapsed
+            root.attrs["route"] = route
+            root.attrs["status"] = response.status_code
+            _recent_traces.append(root.to_dict() | {"trace_id": root.trace_id})
+            _current_span.set(None)
+            response.headers["X-Trace-Id"] = root.trace_id
+
+        return response
+
+    app.register_blueprint(metrics_bp)
+
+
+@metrics_bp.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    return Response(render(), mimetype="text/plain; version=0.0.4")
+
+
+@metrics_bp.route("/metrics/traces", methods=["GET"])
+def recent_traces():
+    return jsonify(list(_recent_traces)), 200
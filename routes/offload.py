@@ -0,0 +1,24 @@
+"""
+Run blocking / CPU-bound calls off the gevent hub.
+
+Under SERVER_MODE=gevent threads are greenlets: an fsync, a Merkle build
+or a model predict keeps the hub's OS thread busy and stalls every
+request of the process. offload() runs such a call on gevent's pool of
+real OS threads there, and inline everywhere else (sync / gthread
+workers, scripts, bench).
+"""
+
+
+def _gevent_patched() -> bool:
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched("threading")
+
+
+def offload(fn, *args, **kwargs):
+    if _gevent_patched():
+        import gevent
+        return gevent.get_hub().threadpool.apply(fn, args, kwargs)
+    return fn(*args, **kwargs)
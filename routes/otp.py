@@ -1,13 +1,17 @@
 from flask import Blueprint, request, jsonify
-import random
-import time
+from concurrent.futures import ThreadPoolExecutor
 from twilio.rest import Client
+import threading
+import random
 import os
 
+from routes.otp_store import create_store
+from routes.metrics import gauge
+
 otp_bp = Blueprint("otp", __name__)
 
-# In-memory OTP store
-otp_store = {}
+# Shared, expiring OTP store (see routes/otp_store.py)
+otp_store = create_store()
 
 # Twilio config
 TWILIO_SID = os.getenv("TWILIO_SID")
@@ -19,6 +23,45 @@ client = Client(TWILIO_SID, TWILIO_AUTH)
 
 OTP_EXPIRY = 300  # 5 minutes
 
+# Rate limits: max sends per window
+OTP_LIMIT_PER_BATCH = int(os.getenv("OTP_LIMIT_PER_BATCH", "3"))
+OTP_LIMIT_PER_PHONE = int(os.getenv("OTP_LIMIT_PER_PHONE", "10"))
+OTP_LIMIT_WINDOW = int(os.getenv("OTP_LIMIT_WINDOW", "900"))  # 15 minutes
+
+# Wrong guesses allowed per OTP before it is burned
+OTP_MAX_ATTEMPTS = int(os.getenv("OTP_MAX_ATTEMPTS", "5"))
+
+# SMS goes out on a background pool so /otp/send never waits on Twilio
+sms_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("OTP_SMS_WORKERS", "4")),
+    thread_name_prefix="otp-sms"
+)
+
+# Submitted but not yet sent (own count; the executor's queue is private)
+_sms_pending = 0
+_sms_lock = threading.Lock()
+
+gauge("otp_sms_queue_depth", "OTP SMS waiting to be sent", lambda: _sms_pending)
+
+
+def _send_sms(body, to):
+    global _sms_pending
+    try:
+        client.messages.create(body=body, from_=TWILIO_PHONE, to=to)
+    except Exception as e:
+        print("⚠️ OTP SMS failed:", e)
+    finally:
+        with _sms_lock:
+            _sms_pending -= 1
+
+
+def _submit_sms(body, to):
+    global _sms_pending
+    with _sms_lock:
+        _sms_pending += 1
+    sms_pool.submit(_send_sms, body, to)
+
+
 @otp_bp.route("/otp/send", methods=["POST"])
 def send_otp():
     data = request.get_json()
@@ -27,18 +70,22 @@ def send_otp():
     if not batch_id:
         return jsonify({"error": "Batch ID required"}), 400
 
+    if otp_store.incr(f"rate:batch:{batch_id}", OTP_LIMIT_WINDOW) > OTP_LIMIT_PER_BATCH:
+        return jsonify({"error": "Too many OTP requests for this batch"}), 429
+
+    if otp_store.incr(f"rate:phone:{FARMER_PHONE}", OTP_LIMIT_WINDOW) > OTP_LIMIT_PER_PHONE:
+        return jsonify({"error": "Too many OTP requests for this phone"}), 429
+
     otp = random.randint(100000, 999999)
 
-    otp_store[batch_id] = {
-        "otp": str(otp),
-        "expires": time.time() + OTP_EXPIRY
-    }
+    otp_store.set(f"otp:{batch_id}", str(otp), OTP_EXPIRY)
+    # A fresh OTP gets a fresh guess budget
+    otp_store.pop(f"attempts:{batch_id}")
 
-    # Send SMS
-    client.messages.create(
-        body=f"AgriChain OTP for batch {batch_id}: {otp}",
-        from_=TWILIO_PHONE,
-        to=FARMER_PHONE
+    # Send SMS (async)
+    _submit_sms(
+        f"AgriChain OTP for batch {batch_id}: {otp}",
+        FARMER_PHONE
     )
 
     return jsonify({"message": "OTP sent"}), 200
@@ -50,17 +97,21 @@ def verify_otp():
     batch_id = data.get("batch_id")
     otp = data.get("otp")
 
-    record = otp_store.get(batch_id)
+    if not batch_id or not otp:
+        return jsonify({"verified": False, "error": "Batch ID and OTP required"}), 400
 
-    if not record:
-        return jsonify({"verified": False}), 400
+    # Atomic check-and-delete: a code verifies at most once
+    if otp_store.consume(f"otp:{batch_id}", str(otp)):
+        otp_store.pop(f"attempts:{batch_id}")
+        return jsonify({"verified": True}), 200
 
-    if time.time() > record["expires"]:
-        otp_store.pop(batch_id)
-        return jsonify({"verified": False, "error": "OTP expired"}), 400
+    # Expired entries are never returned by the store
+    if otp_store.get(f"otp:{batch_id}") is None:
+        return jsonify({"verified": False, "error": "OTP expired or not requested"}), 400
 
-    if record["otp"] != otp:
-        return jsonify({"verified": False}), 400
+    if otp_store.incr(f"attempts:{batch_id}", OTP_EXPIRY) >= OTP_MAX_ATTEMPTS:
+        # Out of guesses: burn the code, a new one must be requested
+        otp_store.pop(f"otp:{batch_id}")
+        return jsonify({"verified": False, "error": "Too many attempts, request a new OTP"}), 429
 
-    otp_store.pop(batch_id)
-    return jsonify({"verified": True}), 200
+    return jsonify({"verified": False}), 400
@@ -0,0 +1,230 @@
+"""
+Expiring key/value stores for OTPs and rate-limit counters.
+
+    OTP_STORE=sqlite (default)  shared by every worker on the host
+    OTP_STORE=memory            single process only (dev / one gevent worker)
+
+Both backends expose the same small API:
+
+    set(key, value, ttl)   get(key)   pop(key)   incr(key, ttl) -> int
+    consume(key, value) -> bool   (delete iff live and equal, atomically)
+"""
+
+from collections import defaultdict
+from contextlib import contextmanager
+import tempfile
+import threading
+import sqlite3
+import queue
+import time
+import os
+
+OTP_STORE = os.getenv("OTP_STORE", "sqlite")
+OTP_STORE_PATH = os.getenv(
+    "OTP_STORE_PATH",
+    os.path.join(tempfile.gettempdir(), "agrichain_otp.sqlite3")
+)
+
+
+# =========================================================
+# In-memory backend with a hashed timing wheel
+# =========================================================
+class MemoryOTPStore:
+    """
+    Entries are also filed in a one-second-resolution wheel slot by
+    expiry. Every call advances the wheel over the seconds elapsed since
+    the previous call and drops what expired there, so eviction costs
+    O(1) amortized per entry and needs no background thread.
+    """
+
+    def __init__(self, wheel_size=3600):
+        self._data = {}                       # key -> (value, expires)
+        self._wheel = defaultdict(set)        # slot -> {keys}
+        self._wheel_size = wheel_size
+        self._last_tick = int(time.time())
+        self._lock = threading.Lock()
+
+    def _advance(self, now):
+        current = int(now)
+        # Seconds up to _last_tick are done; never sweep more
+        # than one full revolution after a long idle period
+        start = max(self._last_tick, current - self._wheel_size) + 1
+
+        for second in range(start, current + 1):
+            slot = self._wheel.pop(second % self._wheel_size, None)
+            if not slot:
+                continue
+            for key in slot:
+                # Live keys found here were re-set and filed elsewhere
+                entry = self._data.get(key)
+                if entry is not None and entry[1] <= now:
+                    self._data.pop(key)
+
+        self._last_tick = max(self._last_tick, current)
+
+    def _live(self, key, now):
+        entry = self._data.get(key)
+        if entry is None or entry[1] <= now:
+            return None
+        return entry
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        expires = now + min(ttl, self._wheel_size - 2)
+        with self._lock:
+            self._advance(now)
+            self._data[key] = (value, expires)
+            self._wheel[int(expires + 1) % self._wheel_size].add(key)
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            self._advance(now)
+            entry = self._live(key, now)
+        return entry[0] if entry else None
+
+    def pop(self, key):
+        now = time.time()
+        with self._lock:
+            self._advance(now)
+            entry = self._live(key, now)
+            self._data.pop(key, None)
+        return entry[0] if entry else None
+
+    def consume(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._advance(now)
+            entry = self._live(key, now)
+            if entry is None or entry[0] != value:
+                return False
+            self._data.pop(key)
+        return True
+
+    def incr(self, key, ttl):
+        """
+        Fixed-window counter: the window starts at the first hit.
+        """
+
+        now = time.time()
+        with self._lock:
+            self._advance(now)
+            entry = self._live(key, now)
+            if entry is None:
+                expires = now + min(ttl, self._wheel_size - 2)
+                self._data[key] = (1, expires)
+                self._wheel[int(expires + 1) % self._wheel_size].add(key)
+                return 1
+
+            count = entry[0] + 1
+            self._data[key] = (count, entry[1])
+            return count
+
+    def __len__(self):
+        return len(self._data)
+
+
+# =========================================================
+# SQLite backend (shared across gunicorn workers)
+# =========================================================
+class SQLiteOTPStore:
+    """
+    Connections are checked out of a LIFO pool rather than kept per
+    thread: under gevent threading.local is greenlet-local, which would
+    open (and leak) one connection per request. The pool only grows to
+    the number of store calls in flight at once.
+    """
+
+    SWEEP_EVERY = 100   # operations between expired-row sweeps
+
+    def __init__(self, path=OTP_STORE_PATH):
+        self._path = path
+        self._pool = queue.LifoQueue()
+        self._ops = 0
+
+        with self._conn() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS otp_kv (
+                    key     TEXT PRIMARY KEY,
+                    value   TEXT NOT NULL,
+                    expires REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS otp_kv_expires ON otp_kv (expires)")
+
+    @contextmanager
+    def _conn(self):
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = sqlite3.connect(
+                self._path, timeout=5, isolation_level=None, check_same_thread=False
+            )
+            conn.execute("PRAGMA busy_timeout=5000")
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def _maybe_sweep(self, conn, now):
+        # Expired rows are already invisible to reads; this only
+        # bounds the file size, using the expires index.
+        self._ops += 1
+        if self._ops % self.SWEEP_EVERY == 0:
+            conn.execute("DELETE FROM otp_kv WHERE expires <= ?", (now,))
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO otp_kv (key, value, expires) VALUES (?, ?, ?)",
+                (key, str(value), now + ttl)
+            )
+            self._maybe_sweep(conn, now)
+
+    def get(self, key):
+        with self._conn() as conn:
+            row = conn.execute(
+                "SELECT value FROM otp_kv WHERE key = ? AND expires > ?",
+                (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def pop(self, key):
+        with self._conn() as conn:
+            row = conn.execute(
+                "DELETE FROM otp_kv WHERE key = ? RETURNING value, expires",
+                (key,)
+            ).fetchone()
+        return row[0] if row and row[1] > time.time() else None
+
+    def consume(self, key, value):
+        # One statement: two concurrent verifies cannot both match
+        with self._conn() as conn:
+            row = conn.execute(
+                "DELETE FROM otp_kv WHERE key = ? AND value = ? AND expires > ? RETURNING key",
+                (key, str(value), time.time())
+            ).fetchone()
+        return row is not None
+
+    def incr(self, key, ttl):
+        now = time.time()
+        with self._conn() as conn:
+            row = conn.execute("""
+                INSERT INTO otp_kv (key, value, expires) VALUES (?, '1', ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    value   = CASE WHEN expires > ? THEN CAST(value AS INTEGER) + 1 ELSE 1 END,
+                    expires = CASE WHEN expires > ? THEN expires ELSE excluded.expires END
+                RETURNING value
+            """, (key, now + ttl, now, now)).fetchone()
+            self._maybe_sweep(conn, now)
+        return int(row[0])
+
+
+def create_store():
+    if OTP_STORE == "memory":
+        return MemoryOTPStore()
+    if OTP_STORE == "sqlite":
+        return SQLiteOTPStore()
+    raise ValueError(f"Unknown OTP_STORE backend: {OTP_STORE}")
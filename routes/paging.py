@@ -0,0 +1,38 @@
+"""
+Paged reads from PostgREST.
+
+A plain select returns at most the server's max-rows (1000 on Supabase)
+and silently drops the rest; fetch_all() walks .range() pages until a
+short page comes back.
+"""
+
+import os
+
+PAGE_ROWS = int(os.getenv("SUPABASE_PAGE_ROWS", "1000"))
+
+
+def fetch_all(build, page_rows: int = PAGE_ROWS) -> list:
+    """
+    build() returns a fresh query with a stable order (not executed);
+    each page re-issues it with .range().
+    """
+
+    rows = []
+    start = 0
+
+    while True:
+        page = build().range(start, start + page_rows - 1).execute().data
+        rows.extend(page)
+        if len(page) < page_rows:
+            return rows
+        start += page_rows
+
+
+def readings_of(rows):
+    """
+    harvest_data.sensor_data holds one reading or a list of them.
+    """
+
+    for row in rows:
+        data = row["sensor_data"]
+        yield from data if isinstance(data, list) else [data]
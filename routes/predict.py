@@ -5,13 +5,16 @@ import numpy as np
 import pandas as pd
 import os
 
+from routes.metrics import instrument_supabase, MODEL_LATENCY
+from routes.offload import offload
+
 # -------------------------------
 # Supabase Configuration (KEPT)
 # -------------------------------
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+supabase = instrument_supabase(create_client(SUPABASE_URL, SUPABASE_KEY))
 
 # Create Blueprint
 predict_bp = Blueprint("predict", __name__)
@@ -73,8 +76,11 @@ def predict_crop_health():
         # ------------------------------------
         # ML Predictions
         # ------------------------------------
-        crop_health_pred = crop_health_model.predict(input_features)
-        disease_pred = disease_model.predict(input_features)
+        with MODEL_LATENCY.time(model="crop_health"):
+            crop_health_pred = offload(crop_health_model.predict, input_features)
+
+        with MODEL_LATENCY.time(model="disease"):
+            disease_pred = offload(disease_model.predict, input_features)
 
         crop_health = health_encoder.inverse_transform(crop_health_pred)[0]
         disease_risk = disease_encoder.inverse_transform(disease_pred)[0]
@@ -0,0 +1,254 @@
+"""
+Opt-in sampling profiler with slow-request capture.
+
+A single background sampler walks the stacks of the requests currently
+being profiled every PROFILE_INTERVAL_MS. When a profiled request ends
+slower than PROFILE_THRESHOLD_MS, its samples are written to PROFILE_DIR
+as collapsed stacks (flamegraph.pl / speedscope import) or speedscope JSON.
+
+    PROFILE_ENABLED=1              turn on at startup
+    PROFILE_SAMPLE_RATE=0.05       fraction of requests profiled
+    PROFILE_BLUEPRINTS=trace,batch_routes   limit to blueprints (empty = all)
+
+GET/POST /admin/profiling toggles it at runtime (X-Admin-Token: ADMIN_TOKEN).
+"""
+
+from flask import Blueprint, jsonify, request, g
+from collections import Counter, deque
+from datetime import datetime
+import threading
+import random
+import json
+import time
+import sys
+import os
+import re
+
+profiler_bp = Blueprint("profiler", __name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(BASE_DIR, "profiles"))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+config = {
+    "enabled": os.getenv("PROFILE_ENABLED", "0") == "1",
+    "sample_rate": float(os.getenv("PROFILE_SAMPLE_RATE", "0.05")),
+    "interval_ms": float(os.getenv("PROFILE_INTERVAL_MS", "10")),
+    "threshold_ms": float(os.getenv("PROFILE_THRESHOLD_MS", "1000")),
+    "blueprints": [b for b in os.getenv("PROFILE_BLUEPRINTS", "").split(",") if b],
+    "format": os.getenv("PROFILE_FORMAT", "collapsed")   # collapsed | speedscope
+}
+
+# =========================================================
+# Execution units: OS threads, or greenlets under gevent
+# =========================================================
+try:
+    from gevent import monkey as _gevent_monkey
+    _GEVENT = _gevent_monkey.is_module_patched("threading")
+except ImportError:
+    _GEVENT = False
+
+if _GEVENT:
+    import greenlet
+    _start_thread = _gevent_monkey.get_original("_thread", "start_new_thread")
+    _os_thread_ident = _gevent_monkey.get_original("_thread", "get_ident")
+    _hub_thread = _os_thread_ident()
+    _sleep = _gevent_monkey.get_original("time", "sleep")
+    _allocate_lock = _gevent_monkey.get_original("_thread", "allocate_lock")
+
+    def _current_unit():
+        return greenlet.getcurrent()
+
+    def _frame_of(unit, frames):
+        # Suspended greenlets expose gr_frame; the running one is the
+        # hub thread's live frame.
+        return unit.gr_frame or frames.get(_hub_thread)
+else:
+    import _thread
+    _start_thread = _thread.start_new_thread
+    _sleep = time.sleep
+    _allocate_lock = _thread.allocate_lock
+
+    def _current_unit():
+        return threading.get_ident()
+
+    def _frame_of(unit, frames):
+        return frames.get(unit)
+
+_active = {}            # execution unit (thread ident / greenlet) -> Counter
+_active_lock = _allocate_lock()
+_captures = deque(maxlen=50)
+_sampler_started = False
+
+
+def _stack_key(frame):
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+def _sampler_loop():
+    while True:
+        _sleep(config["interval_ms"] / 1000.0)
+
+        if not _active:
+            continue
+
+        frames = sys._current_frames()
+        with _active_lock:
+            for unit, samples in _active.items():
+                frame = _frame_of(unit, frames)
+                if frame is not None:
+                    samples[_stack_key(frame)] += 1
+
+
+def _ensure_sampler():
+    global _sampler_started
+    if not _sampler_started:
+        _sampler_started = True
+        # A real OS thread even under gevent, so sampling is not
+        # starved by CPU-bound request code.
+        _start_thread(_sampler_loop, ())
+
+
+# =========================================================
+# Output
+# =========================================================
+def _write_profile(name, samples, elapsed_ms):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+    safe = re.sub(r"[^A-Za-z0-9_.-]", "_", name)
+
+    if config["format"] == "speedscope":
+        frames, index, stacks, weights = [], {}, [], []
+        for stack, count in samples.items():
+            ids = []
+            for part in stack.split(";"):
+                if part not in index:
+                    index[part] = len(frames)
+                    frames.append({"name": part})
+                ids.append(index[part])
+            stacks.append(ids)
+            weights.append(count * config["interval_ms"])
+
+        path = os.path.join(PROFILE_DIR, f"{stamp}_{safe}_{int(elapsed_ms)}ms.speedscope.json")
+        with open(path, "w") as f:
+            json.dump({
+                "$schema": "https://www.speedscope.app/file-format-schema.json",
+                "shared": {"frames": frames},
+                "profiles": [{
+                    "type": "sampled",
+                    "name": name,
+                    "unit": "milliseconds",
+                    "startValue": 0,
+                    "endValue": sum(weights),
+                    "samples": stacks,
+                    "weights": weights
+                }]
+            }, f)
+    else:
+        path = os.path.join(PROFILE_DIR, f"{stamp}_{safe}_{int(elapsed_ms)}ms.collapsed")
+        with open(path, "w") as f:
+            for stack, count in samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+    return path
+
+
+# =========================================================
+# Flask wiring
+# =========================================================
+def _should_profile():
+    if not config["enabled"]:
+        return False
+    if config["blueprints"] and request.blueprint not in config["blueprints"]:
+        return False
+    return random.random() < config["sample_rate"]
+
+
+def init_app(app):
+    @app.before_request
+    def _profile_start():
+        if not _should_profile():
+            return
+
+        _ensure_sampler()
+        unit = _current_unit()
+        with _active_lock:
+            _active[unit] = Counter()
+        g.profile_unit = unit
+        g.profile_start = time.perf_counter()
+
+    @app.teardown_request
+    def _profile_finish(_exc):
+        unit = g.pop("profile_unit", None)
+        if unit is None:
+            return
+
+        elapsed_ms = (time.perf_counter() - g.pop("profile_start")) * 1000
+        with _active_lock:
+            samples = _active.pop(unit, None)
+
+        if samples and elapsed_ms >= config["threshold_ms"]:
+            name = f"{request.method} {request.url_rule.rule if request.url_rule else request.path}"
+            try:
+                path = _write_profile(name, samples, elapsed_ms)
+                _captures.append({
+                    "request": name,
+                    "elapsed_ms": round(elapsed_ms, 1),
+                    "samples": sum(samples.values()),
+                    "file": path,
+                    "captured_at": datetime.utcnow().isoformat()
+                })
+                print("🐢 Slow request profiled:", name, f"{elapsed_ms:.0f}ms →", path)
+            except Exception as e:
+                print("⚠️ Profile write failed:", e)
+
+    app.register_blueprint(profiler_bp)
+
+
+# =========================================================
+# ADMIN: status / toggle
+# GET  /admin/profiling
+# POST /admin/profiling  {"enabled": true, "sample_rate": 0.1, ...}
+# =========================================================
+@profiler_bp.route("/admin/profiling", methods=["GET", "POST"])
+def profiling_admin():
+    if not ADMIN_TOKEN or request.headers.get("X-Admin-Token") != ADMIN_TOKEN:
+        return jsonify({"error": "Forbidden"}), 403
+
+    if request.method == "POST":
+        data = request.get_json(silent=True) or {}
+        # Validate everything first: a bad field changes nothing
+        updates = {}
+        try:
+            if "enabled" in data:
+                updates["enabled"] = bool(data["enabled"])
+            for key in ("sample_rate", "interval_ms", "threshold_ms"):
+                if key in data:
+                    updates[key] = float(data[key])
+            if "blueprints" in data:
+                blueprints = data["blueprints"] or []
+                # Same "trace,batch_routes" form as PROFILE_BLUEPRINTS
+                if isinstance(blueprints, str):
+                    blueprints = blueprints.split(",")
+                updates["blueprints"] = [str(b).strip() for b in blueprints if str(b).strip()]
+            if data.get("format") in ("collapsed", "speedscope"):
+                updates["format"] = data["format"]
+        except (TypeError, ValueError):
+            return jsonify({"error": "Invalid profiling settings"}), 400
+
+        interval = updates.get("interval_ms")
+        if interval is not None and not 0 < interval < float("inf"):
+            return jsonify({"error": "Invalid profiling settings", "details": "interval_ms must be > 0"}), 400
+
+        config.update(updates)
+
+    return jsonify({
+        "config": config,
+        "active_requests": len(_active),
+        "recent_captures": list(_captures)
+    }), 200
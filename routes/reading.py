@@ -0,0 +1,210 @@
+"""
+Single canonical sensor reading shared by every ingest path
+(app.py /sensor-data, /api/sensors/sensor-data, the simulator).
+
+Canonical dict (this exact key set is what gets hashed):
+
+    {"airTemp", "humidity", "soilMoisture", "npk": {"N","P","K"},
+     "soilPH", "timestamp"}
+"""
+
+from datetime import datetime, timezone
+import zlib
+import json
+import math
+import os
+
+from routes.hash_readings import canonical_json, hash_reading
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Cap on the inflated size of a gzip request body (backlog chunks)
+MAX_BODY_BYTES = int(os.getenv("MAX_BODY_BYTES", str(8 * 1024 * 1024)))
+
+
+class ReadingError(ValueError):
+    pass
+
+
+def loads(body):
+    """
+    Fast JSON decode of a request body (bytes / str).
+    """
+
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+def parse_body(flask_request):
+    """
+    Like request.get_json(silent=True) but via the fast decoder and
+    without requiring an application/json content type (ESP32 clients).
+    """
+
+    body = flask_request.get_data(cache=True)
+    if not body:
+        return None
+
+    # Backlog uploads arrive gzip-compressed
+    if flask_request.headers.get("Content-Encoding", "").lower() == "gzip":
+        inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            body = inflater.decompress(body, MAX_BODY_BYTES)
+        except zlib.error:
+            return None
+        if inflater.unconsumed_tail:
+            return None
+
+    try:
+        data = loads(body)
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _number(value, field):
+    """
+    int / float pass through unchanged (keeps canonical bytes stable);
+    numeric strings are coerced; anything else is rejected, including
+    NaN / Infinity (JSON literals, "nan" strings or overflow like 1e400),
+    which cannot be stored or hashed canonically.
+    """
+
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        raise ReadingError(f"{field} must be a number")
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        if math.isfinite(value):
+            return value
+    elif isinstance(value, str):
+        text = value.strip()
+        try:
+            return int(text)
+        except ValueError:
+            pass
+        try:
+            number = float(text)
+        except ValueError:
+            pass
+        else:
+            if math.isfinite(number):
+                return number
+    raise ReadingError(f"{field} must be a number")
+
+
+def _device_time(value):
+    """
+    Device-assigned reading time: epoch seconds / milliseconds or an
+    ISO-8601 string. Normalized to naive UTC isoformat, like utcnow().
+    """
+
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        raise ReadingError("ts must be epoch seconds or ISO-8601")
+
+    if isinstance(value, (int, float)):
+        seconds = value / 1000 if value > 1e11 else value
+        if seconds <= 0:
+            raise ReadingError("ts must be positive")
+        return datetime.fromtimestamp(seconds, timezone.utc).replace(tzinfo=None).isoformat()
+
+    if isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+        except ValueError:
+            raise ReadingError("ts must be epoch seconds or ISO-8601")
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        return parsed.isoformat()
+
+    raise ReadingError("ts must be epoch seconds or ISO-8601")
+
+
+def _first(data, *keys):
+    for key in keys:
+        value = data.get(key)
+        if value is not None:
+            return value
+    return None
+
+
+def _npk(data):
+    npk = data.get("npk")
+
+    if isinstance(npk, str):
+        parts = npk.split("-")
+        if len(parts) != 3:
+            raise ReadingError("npk string must be N-P-K")
+        npk = dict(zip(("N", "P", "K"), parts))
+
+    if isinstance(npk, dict):
+        n, p, k = npk.get("N"), npk.get("P"), npk.get("K")
+    elif npk is None:
+        n, p, k = data.get("nitrogen"), data.get("phosphorus"), data.get("potassium")
+    else:
+        raise ReadingError("npk must be an object or N-P-K string")
+
+    return {
+        "N": _number(n, "npk.N"),
+        "P": _number(p, "npk.P"),
+        "K": _number(k, "npk.K")
+    }
+
+
+class Reading:
+    __slots__ = ("airTemp", "humidity", "soilMoisture", "npk", "soilPH", "timestamp")
+
+    def __init__(self, airTemp=None, humidity=None, soilMoisture=None,
+                 npk=None, soilPH=None, timestamp=None):
+        self.airTemp = airTemp
+        self.humidity = humidity
+        self.soilMoisture = soilMoisture
+        self.npk = npk if npk is not None else {"N": None, "P": None, "K": None}
+        self.soilPH = soilPH
+        self.timestamp = timestamp or datetime.utcnow().isoformat()
+
+    @classmethod
+    def from_payload(cls, data: dict, timestamp=None):
+        """
+        Accepts both naming schemes (airTemp / temperature,
+        soilMoisture / soil_moisture, npk / nitrogen+phosphorus+potassium).
+        A device-assigned `ts` is kept as the timestamp so a retried
+        reading hashes identically. Raises ReadingError on malformed values.
+        """
+
+        if not isinstance(data, dict):
+            raise ReadingError("Reading must be a JSON object")
+
+        return cls(
+            airTemp=_number(_first(data, "airTemp", "temperature"), "airTemp"),
+            humidity=_number(data.get("humidity"), "humidity"),
+            soilMoisture=_number(_first(data, "soilMoisture", "soil_moisture"), "soilMoisture"),
+            npk=_npk(data),
+            soilPH=_number(_first(data, "soilPH", "ph"), "soilPH"),
+            timestamp=timestamp or _device_time(data.get("ts"))
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "airTemp": self.airTemp,
+            "humidity": self.humidity,
+            "soilMoisture": self.soilMoisture,
+            "npk": self.npk,
+            "soilPH": self.soilPH,
+            "timestamp": self.timestamp
+        }
+
+    def canonical_json(self) -> bytes:
+        return canonical_json(self.to_dict())
+
+    def hash(self) -> str:
+        return hash_reading(self.to_dict())
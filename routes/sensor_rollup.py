@@ -0,0 +1,341 @@
+"""
+Time-bucketed rollups of sensor readings, maintained on ingest.
+
+Supabase table (one row per batch / resolution / bucket):
+
+    create table sensor_rollups (
+        batch_id      text not null,
+        resolution    text not null,          -- minute | hour | day
+        bucket_start  timestamp not null,
+        reading_count integer not null default 0,
+        stats         jsonb   not null,
+        primary key (batch_id, resolution, bucket_start)
+    );
+
+Ingest sends per-bucket deltas; the database adds them atomically
+(merge_stats() is defined in routes/batch_summary.py):
+
+    create or replace function merge_sensor_rollups(
+        p_batch_id text, p_rows jsonb
+    ) returns void language sql as $$
+        insert into sensor_rollups as r
+            (batch_id, resolution, bucket_start, reading_count, stats)
+        select p_batch_id, x->>'resolution', (x->>'bucket_start')::timestamp,
+               (x->>'reading_count')::integer, x->'stats'
+          from jsonb_array_elements(p_rows) as x
+        on conflict (batch_id, resolution, bucket_start) do update
+           set reading_count = r.reading_count + excluded.reading_count,
+               stats         = merge_stats(r.stats, excluded.stats)
+    $$;
+
+A rebuild swaps a batch's buckets in one transaction, so concurrent
+merges wait on it instead of hitting a half-deleted table:
+
+    create or replace function replace_sensor_rollups(
+        p_batch_id text, p_rows jsonb
+    ) returns void language sql as $$
+        delete from sensor_rollups where batch_id = p_batch_id;
+        insert into sensor_rollups
+            (batch_id, resolution, bucket_start, reading_count, stats)
+        select p_batch_id, x->>'resolution', (x->>'bucket_start')::timestamp,
+               (x->>'reading_count')::integer, x->'stats'
+          from jsonb_array_elements(p_rows) as x;
+    $$;
+
+Rebuild from harvest_data:
+
+    python -m routes.sensor_rollup <batch_id> [<batch_id> ...]
+"""
+
+from supabase import create_client
+from datetime import datetime, timezone
+import os
+import sys
+
+from routes.metric_stats import METRICS, add_reading, extract_metrics
+from routes.batch_archive import is_archived, load_column
+from routes.metrics import instrument_supabase
+from routes.paging import fetch_all, readings_of
+
+# -------------------------------
+# Supabase Configuration
+# -------------------------------
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+supabase = instrument_supabase(create_client(SUPABASE_URL, SUPABASE_KEY))
+
+ROLLUP_TABLE = "sensor_rollups"
+
+RESOLUTIONS = ("minute", "hour", "day")
+
+# Hard cap on buckets / points returned by one request
+MAX_BUCKETS = int(os.getenv("ROLLUP_MAX_BUCKETS", "1000"))
+
+
+def bucket_start(ts: datetime, resolution: str) -> str:
+    if resolution == "minute":
+        ts = ts.replace(second=0, microsecond=0)
+    elif resolution == "hour":
+        ts = ts.replace(minute=0, second=0, microsecond=0)
+    elif resolution == "day":
+        ts = ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    else:
+        raise ValueError(f"Unknown resolution: {resolution}")
+
+    return ts.isoformat()
+
+
+def _reading_time(reading: dict) -> datetime:
+    try:
+        return datetime.fromisoformat(reading.get("timestamp"))
+    except (TypeError, ValueError):
+        return datetime.utcnow()
+
+
+def _epoch(reading: dict) -> float:
+    # Naive timestamps are UTC, not the host's local time
+    ts = _reading_time(reading)
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+
+def _row(batch_id: str, resolution: str, start: str, bucket: dict) -> dict:
+    return {
+        "batch_id": batch_id,
+        "resolution": resolution,
+        "bucket_start": start,
+        "reading_count": bucket["reading_count"],
+        "stats": bucket["stats"]
+    }
+
+
+def _buckets(readings) -> dict:
+    buckets = {}
+    for reading in readings:
+        ts = _reading_time(reading)
+        for resolution in RESOLUTIONS:
+            key = (resolution, bucket_start(ts, resolution))
+            bucket = buckets.setdefault(key, {"reading_count": 0, "stats": {}})
+            bucket["reading_count"] += 1
+            add_reading(bucket["stats"], reading)
+    return buckets
+
+
+# =========================================================
+# INGEST HOOK: fold readings into minute/hour/day buckets
+# =========================================================
+def merge_rollups(batch_id: str, readings) -> None:
+    """
+    Aggregate a chunk per bucket, then one atomic round trip.
+    """
+
+    buckets = _buckets(readings)
+    if not buckets:
+        return
+
+    supabase.rpc("merge_sensor_rollups", {
+        "p_batch_id": batch_id,
+        "p_rows": [
+            _row(batch_id, resolution, start, bucket)
+            for (resolution, start), bucket in buckets.items()
+        ]
+    }).execute()
+
+
+# =========================================================
+# READ: bucketed series for a batch and time range
+# =========================================================
+def get_rollups(batch_id, resolution="hour", start=None, end=None):
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"resolution must be one of {', '.join(RESOLUTIONS)}")
+
+    query = supabase.table(ROLLUP_TABLE) \
+        .select("bucket_start, reading_count, stats") \
+        .eq("batch_id", batch_id) \
+        .eq("resolution", resolution)
+
+    if start:
+        query = query.gte("bucket_start", start)
+    if end:
+        query = query.lt("bucket_start", end)
+
+    # Fetch one extra row to detect truncation
+    res = query.order("bucket_start", desc=False) \
+        .limit(MAX_BUCKETS + 1) \
+        .execute()
+
+    buckets = []
+
+    for row in res.data[:MAX_BUCKETS]:
+        metrics = {}
+        for metric, stats in (row["stats"] or {}).items():
+            if stats["count"]:
+                metrics[metric] = {
+                    "mean": round(stats["sum"] / stats["count"], 4),
+                    "min": stats["min"],
+                    "max": stats["max"]
+                }
+
+        buckets.append({
+            "bucket_start": row["bucket_start"],
+            "count": row["reading_count"],
+            "metrics": metrics
+        })
+
+    return {
+        "batch_id": batch_id,
+        "resolution": resolution,
+        "buckets": buckets,
+        "truncated": len(res.data) > MAX_BUCKETS
+    }
+
+
+# =========================================================
+# LTTB: Largest-Triangle-Three-Buckets downsampling
+# =========================================================
+def lttb(points, threshold):
+    """
+    Downsample [(x, y), ...] (sorted by x) to `threshold` points
+    while preserving the visual shape of the series.
+    """
+
+    n = len(points)
+    if threshold >= n or threshold < 3:
+        return list(points)
+
+    sampled = [points[0]]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+
+    for i in range(threshold - 2):
+        # Average of the next bucket (third triangle vertex)
+        avg_start = int((i + 1) * every) + 1
+        avg_end = min(int((i + 2) * every) + 1, n)
+        span = avg_end - avg_start
+        avg_x = sum(p[0] for p in points[avg_start:avg_end]) / span
+        avg_y = sum(p[1] for p in points[avg_start:avg_end]) / span
+
+        # Pick the point in this bucket with the largest triangle
+        range_start = int(i * every) + 1
+        range_end = int((i + 1) * every) + 1
+        ax, ay = points[a]
+
+        max_area = -1.0
+        next_a = range_start
+
+        for j in range(range_start, range_end):
+            area = abs(
+                (ax - avg_x) * (points[j][1] - ay) -
+                (ax - points[j][0]) * (avg_y - ay)
+            )
+            if area > max_area:
+                max_area = area
+                next_a = j
+
+        sampled.append(points[next_a])
+        a = next_a
+
+    sampled.append(points[-1])
+    return sampled
+
+
+def _archived_series(batch_id, metric, start=None, end=None):
+    """
+    (x, y) from the memory-mapped archive columns; start / end apply
+    to the reading timestamp.
+    """
+
+    timestamps = load_column(batch_id, "timestamp").tolist()
+    values = load_column(batch_id, metric).tolist()
+
+    return [
+        (_epoch({"timestamp": ts}), y)
+        for ts, y in zip(timestamps, values)
+        if y == y   # NaN = missing
+        and not (start and ts < start)
+        and not (end and ts >= end)
+    ]
+
+
+def _database_series(batch_id, metric, start=None, end=None):
+    def query():
+        q = supabase.table("harvest_data") \
+            .select("sensor_data, created_at") \
+            .eq("batch_id", batch_id)
+        if start:
+            q = q.gte("created_at", start)
+        if end:
+            q = q.lt("created_at", end)
+        return q.order("created_at", desc=False)
+
+    series = []
+
+    for reading in readings_of(fetch_all(query)):
+        value = extract_metrics(reading).get(metric)
+        if value is not None:
+            series.append((_epoch(reading), value))
+
+    return series
+
+
+def downsample_raw(batch_id, metric, points=500, start=None, end=None):
+    if metric not in METRICS:
+        raise ValueError(f"metric must be one of {', '.join(METRICS)}")
+
+    points = max(3, min(int(points), MAX_BUCKETS))
+
+    # Finalized batches: columns from cold storage, no harvest_data scan
+    if is_archived(batch_id):
+        series = _archived_series(batch_id, metric, start, end)
+    else:
+        series = _database_series(batch_id, metric, start, end)
+
+    # Insert order is not reading order (backlog uploads land late);
+    # LTTB needs x ascending
+    series.sort(key=lambda p: p[0])
+
+    return {
+        "batch_id": batch_id,
+        "metric": metric,
+        "raw_points": len(series),
+        "points": [
+            {
+                "timestamp": datetime.fromtimestamp(x, timezone.utc).replace(tzinfo=None).isoformat(),
+                "value": y
+            }
+            for x, y in lttb(series, points)
+        ]
+    }
+
+
+# =========================================================
+# REBUILD: recompute all rollups for a batch
+# =========================================================
+def rebuild_rollups(batch_id: str) -> int:
+    rows = fetch_all(lambda: supabase.table("harvest_data")
+                     .select("sensor_data")
+                     .eq("batch_id", batch_id)
+                     .order("created_at", desc=False))
+    readings = list(readings_of(rows))
+
+    buckets = _buckets(readings)
+
+    supabase.rpc("replace_sensor_rollups", {
+        "p_batch_id": batch_id,
+        "p_rows": [
+            _row(batch_id, resolution, start, bucket)
+            for (resolution, start), bucket in sorted(buckets.items())
+        ]
+    }).execute()
+
+    return len(readings)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("usage: python -m routes.sensor_rollup <batch_id> [...]")
+        sys.exit(1)
+
+    for arg in sys.argv[1:]:
+        print("✅ Rebuilt rollups:", arg, "readings:", rebuild_rollups(arg))
@@ -1,18 +1,242 @@
 import random
-from datetime import datetime
+import asyncio
+import argparse
+import gzip
+import json
+import time
+
+from routes.reading import Reading
 
 def generate_reading():
-    return {
+    return Reading.from_payload({
         "airTemp": round(random.uniform(25, 35), 2),
         "humidity": round(random.uniform(50, 80), 2),
         "soilMoisture": round(random.uniform(25, 45), 2),
         "npk": "12-8-10",
-        "soilPH": round(random.uniform(6.0, 7.0), 2),
-        "timestamp": datetime.utcnow().isoformat()
-    }
+        "soilPH": round(random.uniform(6.0, 7.0), 2)
+    }).to_dict()
+
+
+# =========================================================
+# FLEET SIMULATOR: thousands of virtual ESP32 devices
+#
+#   python -m routes.sensor_simulation --url http://localhost:5000 \
+#       --devices 2000 --rate 0.5 --duration 60
+# =========================================================
+
+# (baseline, drift step, min, max) per ESP32 payload field
+SENSOR_MODEL = {
+    "temperature": (30.0, 0.05, 10.0, 45.0),
+    "humidity": (65.0, 0.2, 20.0, 100.0),
+    "soil_moisture": (35.0, 0.1, 5.0, 80.0),
+    "soilPH": (6.5, 0.005, 4.5, 8.5),
+    "nitrogen": (40.0, 0.3, 0.0, 140.0),
+    "phosphorus": (25.0, 0.2, 0.0, 100.0),
+    "potassium": (30.0, 0.2, 0.0, 120.0)
+}
+
+
+class VirtualDevice:
+    """
+    Mean-reverting random walk per sensor, so values drift
+    realistically instead of being independent uniform draws.
+    """
+
+    def __init__(self, device_id, rng):
+        self.device_id = device_id
+        self.rng = rng
+        self.state = {
+            key: base + rng.uniform(-0.1, 0.1) * base
+            for key, (base, _, _, _) in SENSOR_MODEL.items()
+        }
+        self.boot = f"{rng.getrandbits(32):08x}"
+        self.seq = 0
+        self.backlog = []
+
+    def next_reading(self):
+        for key, (base, step, low, high) in SENSOR_MODEL.items():
+            value = self.state[key]
+            value += self.rng.gauss(0, step) + 0.01 * (base - value)
+            self.state[key] = min(high, max(low, value))
+
+        self.seq += 1
+
+        return {
+            "device_id": self.device_id,
+            "boot": self.boot,
+            "seq": self.seq,
+            "ts": round(time.time(), 3),
+            "temperature": round(self.state["temperature"], 2),
+            "humidity": round(self.state["humidity"], 2),
+            "soil_moisture": round(self.state["soil_moisture"], 2),
+            "soilPH": round(self.state["soilPH"], 2),
+            "nitrogen": round(self.state["nitrogen"]),
+            "phosphorus": round(self.state["phosphorus"]),
+            "potassium": round(self.state["potassium"])
+        }
+
+
+class FleetStats:
+    def __init__(self):
+        self.latencies = []
+        self.status = {}
+        self.errors = 0
+        self.sent = 0
+
+    def record(self, latency, status):
+        self.sent += 1
+        self.latencies.append(latency)
+        self.status[str(status)] = self.status.get(str(status), 0) + 1
+        if status == "error" or status >= 400:
+            self.errors += 1
+
+    def report(self, elapsed, devices, rate):
+        latencies = sorted(l * 1000 for l in self.latencies)
+
+        def pct(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))], 2)
+
+        return {
+            "devices": devices,
+            "target_rps": round(devices * rate, 1),
+            "achieved_rps": round(self.sent / elapsed, 1) if elapsed else None,
+            "sent": self.sent,
+            "errors": self.errors,
+            "error_rate": round(self.errors / self.sent, 4) if self.sent else 0.0,
+            "status": self.status,
+            "latency_ms": {"p50": pct(50), "p95": pct(95), "p99": pct(99),
+                           "max": round(latencies[-1], 2) if latencies else None},
+            "elapsed_s": round(elapsed, 2)
+        }
+
+
+async def _post(client, url, payload, stats):
+    """
+    True once the server has the reading (stored or duplicate).
+    """
+
+    start = time.perf_counter()
+    try:
+        res = await client.post(url, json=payload)
+        stats.record(time.perf_counter() - start, res.status_code)
+        return res.status_code < 500
+    except Exception:
+        stats.record(time.perf_counter() - start, "error")
+        return False
+
+
+async def _flush_backlog(device, client, url, args, stats):
+    """
+    Store-and-forward: upload buffered readings in gzip chunks and
+    drop everything up to the acknowledged seq.
+    """
+
+    while device.backlog:
+        chunk = device.backlog[:args.chunk_size]
+        body = gzip.compress(json.dumps({
+            "device_id": device.device_id,
+            "boot": device.boot,
+            "readings": [
+                {k: v for k, v in r.items() if k not in ("device_id", "boot")}
+                for r in chunk
+            ]
+        }).encode())
+
+        start = time.perf_counter()
+        try:
+            res = await client.post(url, content=body, headers={
+                "Content-Type": "application/json",
+                "Content-Encoding": "gzip"
+            })
+            stats.record(time.perf_counter() - start, res.status_code)
+        except Exception:
+            stats.record(time.perf_counter() - start, "error")
+            return
+
+        if res.status_code >= 400:
+            return
+
+        acked = res.json().get("acked_seq") or 0
+        device.backlog = [r for r in device.backlog if r["seq"] > acked]
+
+
+async def _device_loop(device, client, urls, args, stats, deadline):
+    url, backlog_url = urls
+    rng = device.rng
+    interval = 1.0 / args.rate
+
+    # Stagger start so devices don't fire in lockstep
+    await asyncio.sleep(rng.uniform(0, interval))
+
+    while time.perf_counter() < deadline:
+        reading = device.next_reading()
+
+        if rng.random() < args.disconnect_prob:
+            # Link drops: buffer for a while, then upload the backlog
+            offline_until = time.perf_counter() + rng.uniform(*args.offline_seconds)
+            device.backlog.append(reading)
+            while time.perf_counter() < min(offline_until, deadline):
+                await asyncio.sleep(interval)
+                device.backlog.append(device.next_reading())
+        elif await _post(client, url, reading, stats):
+            # Lost ACK: the device retries a reading the server already has
+            if rng.random() < args.duplicate_prob:
+                await _post(client, url, reading, stats)
+        else:
+            device.backlog.append(reading)
+
+        if device.backlog:
+            await _flush_backlog(device, client, backlog_url, args, stats)
+
+        jitter = rng.uniform(-args.jitter, args.jitter) * interval
+        await asyncio.sleep(max(0.0, interval + jitter))
+
+
+async def run_fleet(args):
+    import httpx
+
+    urls = (args.url.rstrip("/") + args.endpoint, args.url.rstrip("/") + args.backlog_endpoint)
+    stats = FleetStats()
+    devices = [
+        VirtualDevice(f"ESP32_{i:05d}", random.Random(args.seed + i))
+        for i in range(args.devices)
+    ]
+
+    limits = httpx.Limits(max_connections=args.max_connections)
+    async with httpx.AsyncClient(limits=limits, timeout=args.timeout) as client:
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*(
+            _device_loop(device, client, urls, args, stats, deadline)
+            for device in devices
+        ))
+        elapsed = time.perf_counter() - started
+
+    return stats.report(elapsed, args.devices, args.rate)
 
 
 if __name__ == "__main__":
-    readings = [generate_reading() for _ in range(6)]
-    print(readings)
+    parser = argparse.ArgumentParser(description="Sensor reading / ESP32 fleet simulator")
+    parser.add_argument("--url", help="backend base URL; omit to just print sample readings")
+    parser.add_argument("--endpoint", default="/api/sensors/sensor-data")
+    parser.add_argument("--backlog-endpoint", default="/api/sensors/backlog")
+    parser.add_argument("--chunk-size", type=int, default=200, help="readings per backlog upload")
+    parser.add_argument("--duplicate-prob", type=float, default=0.01, help="chance of re-sending an ACKed reading")
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument("--rate", type=float, default=1.0, help="readings/sec per device")
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--jitter", type=float, default=0.2, help="± fraction of the interval")
+    parser.add_argument("--disconnect-prob", type=float, default=0.001)
+    parser.add_argument("--offline-seconds", type=float, nargs=2, default=(5.0, 30.0))
+    parser.add_argument("--max-connections", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
 
+    if not args.url:
+        readings = [generate_reading() for _ in range(6)]
+        print(readings)
+    else:
+        print(json.dumps(asyncio.run(run_fleet(args)), indent=2))
@@ -1,93 +1,474 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
 from supabase import create_client
-from datetime import datetime
+import uuid
 import os
 
+from routes.batch_summary import merge_summary, get_summary
+from routes.sensor_rollup import merge_rollups, get_rollups, downsample_raw
+from routes.live_stream import hub, ALL_TOPIC
+from routes.metrics import instrument_supabase
+from routes.reading import Reading, ReadingError, parse_body
+from routes.farm_routing import resolve_farm, active_batch_for_farm, batch_closed, reroute
+from routes.blockchain_automation import add_reading_and_maybe_commit
+from routes.dedup import recent, idempotency_key, mark_duplicate, next_created_at, stored_keys
+from routes import ingest_spool
+from routes.anomaly import inspect as inspect_reading, inspect_many, observe as observe_readings, \
+    should_quarantine, stats as anomaly_stats
+
 # -------------------------------
 # Supabase Configuration
 # -------------------------------
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+supabase = instrument_supabase(create_client(SUPABASE_URL, SUPABASE_KEY))
+
+BACKLOG_MAX_READINGS = int(os.getenv("BACKLOG_MAX_READINGS", "500"))
 
 # -------------------------------
 # Create Blueprint
 # -------------------------------
 sensors_bp = Blueprint("sensors", __name__)
 
+
+def _latest_payload(batch_id, sensor, merkle_root, blockchain_tx, network, anomalies=None):
+    return {
+        "batch_id": batch_id,
+        "airTemp": sensor.get("airTemp"),
+        "humidity": sensor.get("humidity"),
+        "soilMoisture": sensor.get("soilMoisture"),
+        "soilPH": sensor.get("soilPH"),
+        "npk": sensor.get("npk"),
+        "timestamp": sensor.get("timestamp"),
+        "merkle_root": merkle_root,
+        "blockchain_tx": blockchain_tx,
+        "network": network,
+        # Consumers (dashboard → /api/predict) should skip flagged readings
+        "anomalies": anomalies or []
+    }
+
+
+def _harvest_row(batch_id, reading, data, key, findings=None):
+    return {
+        "batch_id": batch_id,
+        "sensor_data": reading,
+        "merkle_root": "PENDING",
+        "blockchain_tx": "PENDING",
+        "network": "sepolia",
+        "ph_source": "simulated",
+        "device_id": data.get("device_id"),
+        "seq": data.get("seq"),
+        "idempotency_key": key,
+        "anomalies": findings or None,
+        "created_at": next_created_at()
+    }
+
+
+def _quarantine(batch_id, data, reading, findings):
+    """
+    Suspect readings are kept for inspection but never anchored.
+    """
+
+    anomaly_stats["quarantined"] += 1
+    try:
+        supabase.table("quarantined_readings").insert({
+            "batch_id": batch_id,
+            "device_id": data.get("device_id"),
+            "sensor_data": reading,
+            "anomalies": findings
+        }).execute()
+    except Exception as e:
+        print("⚠️ Quarantine insert failed:", e)
+
+
+def _store_rows(rows):
+    """
+    Insert harvest rows; keyed rows go through the unique index and
+    only the rows actually inserted come back.
+
+    With the spool active the rows are only appended locally (durable)
+    and None is returned: the replicator inserts them and runs the
+    post-insert hooks for whatever was not a duplicate.
+    """
+
+    if ingest_spool.active():
+        for row in rows:
+            # Replays after a crash must be no-ops, keyed or not
+            row["idempotency_key"] = row["idempotency_key"] or f"spool:{uuid.uuid4().hex}"
+        ingest_spool.append(rows)
+        return None
+
+    if all(row["idempotency_key"] for row in rows):
+        res = supabase.table("harvest_data").upsert(
+            rows,
+            on_conflict="idempotency_key",
+            ignore_duplicates=True
+        ).execute()
+        return res.data
+
+    supabase.table("harvest_data").insert(rows).execute()
+    return rows
+
+
+def _store_routed(rows):
+    """
+    _store_rows, re-routed once if the batch was finalized between
+    routing and insert (rejected by harvest_data_batch_open()).
+    Read the final batch_id from the rows. A request's rows come from
+    one device, so if its farm has no ACTIVE batch the error stands.
+    """
+
+    try:
+        return _store_rows(rows)
+    except Exception as e:
+        if not batch_closed(e) or reroute(rows):
+            raise
+
+    return _store_rows(rows)
+
+
+def _duplicate(key, **extra):
+    mark_duplicate()
+    return jsonify({
+        "message": "Duplicate reading ignored",
+        "duplicate": True,
+        "idempotency_key": key,
+        **extra
+    }), 200
+
+
+def _all_stored(keys) -> bool:
+    """
+    True if every key is already stored. Never raises: this only turns
+    an error response into a duplicate ack.
+    """
+
+    try:
+        return bool(keys) and stored_keys(keys) >= set(keys)
+    except Exception as e:
+        print("⚠️ Idempotency key lookup failed:", e)
+        return False
+
+
+def _after_insert(batch_id, readings):
+    # 📊 Keep per-batch aggregates current: one delta per call, not per
+    # reading (never fails ingest)
+    try:
+        reading_count = merge_summary(batch_id, readings)
+        # ⏰ Wake the auto-finalize scheduler when the batch is full
+        add_reading_and_maybe_commit(batch_id, reading_count)
+    except Exception as e:
+        print("⚠️ Batch summary update failed:", e)
+
+    try:
+        merge_rollups(batch_id, readings)
+    except Exception as e:
+        print("⚠️ Sensor rollup update failed:", e)
+
+
+def _on_replicated(rows):
+    # A shipped chunk folds into each batch's aggregates at once
+    by_batch = {}
+    for row in rows:
+        by_batch.setdefault(row["batch_id"], []).append(row["sensor_data"])
+
+    for batch_id, readings in by_batch.items():
+        _after_insert(batch_id, readings)
+
+
+ingest_spool.set_replicated_handler(_on_replicated)
+
+
 # =========================================================
 # POST: Receive sensor data (ESP32 / Simulator)
 # POST /api/sensors/sensor-data
+# Retries are idempotent when the device sends device_id + seq
+# (or an Idempotency-Key header); see routes/dedup.py.
 # =========================================================
 @sensors_bp.route("/sensor-data", methods=["POST"])
 def receive_sensor_data():
-    data = request.get_json(silent=True)
+    data = parse_body(request)
     if not data:
         return jsonify({"error": "No sensor data received"}), 400
 
+    # ✅ Build canonical sensor reading (validated + coerced)
     try:
-        # 🔐 ALWAYS resolve ACTIVE batch from DATABASE
-        batch_res = supabase.table("batches") \
-            .select("batch_id, status") \
-            .eq("status", "ACTIVE") \
-            .order("start_date", desc=True) \
-            .limit(1) \
-            .execute()
+        reading = Reading.from_payload(data).to_dict()
+        key = idempotency_key(data, request.headers)
+    except ReadingError as e:
+        return jsonify({"error": "Invalid sensor data", "details": str(e)}), 400
+
+    # 🔁 Retry of a reading this process already stored
+    if key and recent.seen(key):
+        return _duplicate(key)
+
+    # 🩺 Spikes / flatlines / out-of-range / NaN values from faulty
+    # sensors (scored only; learned once the reading is accepted)
+    findings = inspect_reading(data.get("device_id"), reading)
 
-        if not batch_res.data:
+    try:
+        # 🔐 Route by device → farm → that farm's ACTIVE batch
+        farm_id = resolve_farm(data)
+        active_batch_id = active_batch_for_farm(farm_id)
+
+        if not active_batch_id:
+            # Stored before its batch was finalized: ack the retry
+            if key and _all_stored([key]):
+                return _duplicate(key, farm_id=farm_id)
             return jsonify({
-                "error": "No active batch. Create a batch first."
+                "error": "No active batch. Create a batch first.",
+                "farm_id": farm_id
             }), 400
 
-        active_batch_id = batch_res.data[0]["batch_id"]
-
-        # ✅ Build canonical sensor reading
-        reading = {
-            "airTemp": data.get("airTemp") or data.get("temperature"),
-            "humidity": data.get("humidity"),
-            "soilMoisture": data.get("soilMoisture") or data.get("soil_moisture"),
-            "npk": data.get("npk") or {
-                "N": data.get("nitrogen"),
-                "P": data.get("phosphorus"),
-                "K": data.get("potassium")
-            },
-            "soilPH": data.get("soilPH"),  # optional
-            "timestamp": datetime.utcnow().isoformat()
-        }
+        if should_quarantine(findings):
+            _quarantine(active_batch_id, data, reading, findings)
+            observe_readings(data.get("device_id"), [reading])
+            if key:
+                recent.add(key)
+            return jsonify({
+                "message": "Reading quarantined",
+                "quarantined": True,
+                "anomalies": findings,
+                "active_batch": active_batch_id,
+                "farm_id": farm_id
+            }), 202
 
         # 🔒 Store reading OFF-CHAIN (cloud only)
-        supabase.table("harvest_data").insert({
-            "batch_id": active_batch_id,
-            "sensor_data": reading,
-            "merkle_root": "PENDING",
-            "blockchain_tx": "PENDING",
-            "network": "sepolia",
-            "ph_source": "simulated"
-        }).execute()
+        rows = [_harvest_row(active_batch_id, reading, data, key, findings)]
+        inserted = _store_routed(rows)
+        active_batch_id = rows[0]["batch_id"]
+
+        if key:
+            recent.add(key)
+
+        spooled = inserted is None
+
+        if not spooled and not inserted:
+            return _duplicate(key, active_batch=active_batch_id, farm_id=farm_id)
+
+        observe_readings(data.get("device_id"), [reading])
+
+        if not spooled:
+            print("✅ Sensor data stored under batch:", active_batch_id)
+            _after_insert(active_batch_id, [reading])
 
-        print("✅ Sensor data stored under batch:", active_batch_id)
+        # 📡 Push to live subscribers (SSE) + latest cache
+        hub.publish(active_batch_id, _latest_payload(
+            active_batch_id, reading, "PENDING", "PENDING", "sepolia", findings
+        ))
 
         return jsonify({
             "message": "Sensor data received",
-            "active_batch": active_batch_id
+            "active_batch": active_batch_id,
+            "farm_id": farm_id,
+            "spooled": spooled,
+            "anomalies": findings
         }), 200
 
     except Exception as e:
+        if batch_closed(e):
+            if key and _all_stored([key]):
+                return _duplicate(key)
+            return jsonify({
+                "error": "Batch was finalized and there is no active batch. Create a batch first.",
+                "details": str(e)
+            }), 409
         return jsonify({
             "error": "Failed to process sensor data",
             "details": str(e)
         }), 500
 
 
+# =========================================================
+# POST: Store-and-forward backlog upload (after reconnect)
+# POST /api/sensors/backlog   (Content-Encoding: gzip optional)
+#
+#   {"device_id": "...", "boot": "...",
+#    "readings": [{"seq": 1, "ts": 1760000000, ...}, ...]}
+#
+# Every reading needs a seq. The response's acked_seq tells the
+# device which readings it may drop from its local buffer.
+# =========================================================
+def _backlog_duplicates(farm_id, duplicates, rejected, acked):
+    mark_duplicate(duplicates)
+    return jsonify({
+        "message": "Backlog already stored",
+        "active_batch": None,
+        "farm_id": farm_id,
+        "accepted": 0,
+        "duplicates": duplicates,
+        "flagged": 0,
+        "quarantined": 0,
+        "rejected": rejected,
+        "acked_seq": max(acked) if acked else None
+    }), 200
+
+
+@sensors_bp.route("/backlog", methods=["POST"])
+def receive_backlog():
+    data = parse_body(request)
+    if not data or not isinstance(data.get("readings"), list):
+        return jsonify({"error": "readings list is required"}), 400
+
+    if not data.get("device_id"):
+        return jsonify({"error": "device_id is required"}), 400
+
+    if len(data["readings"]) > BACKLOG_MAX_READINGS:
+        return jsonify({
+            "error": "Backlog chunk too large",
+            "max_readings": BACKLOG_MAX_READINGS
+        }), 413
+
+    pending, rejected, acked = [], [], []
+    chunk_keys = set()
+    duplicates = 0
+
+    for index, item in enumerate(data["readings"]):
+        if not isinstance(item, dict):
+            rejected.append({"index": index, "error": "Reading must be a JSON object"})
+            continue
+
+        item = {**item, "device_id": data["device_id"], "boot": data.get("boot")}
+
+        try:
+            reading = Reading.from_payload(item).to_dict()
+            key = idempotency_key(item)
+        except ReadingError as e:
+            rejected.append({"index": index, "error": str(e)})
+            continue
+
+        if key is None:
+            rejected.append({"index": index, "error": "seq is required"})
+            continue
+
+        acked.append(item["seq"])
+
+        if key in chunk_keys or recent.seen(key):
+            duplicates += 1
+            continue
+
+        chunk_keys.add(key)
+        pending.append((item, reading, key))
+
+    farm_id = None
+
+    try:
+        farm_id = resolve_farm(data)
+        active_batch_id = active_batch_for_farm(farm_id)
+
+        if not active_batch_id:
+            # Every reading stored before its batch was finalized:
+            # ack the retry so the device can drop its buffer
+            if _all_stored([key for _, _, key in pending]):
+                return _backlog_duplicates(farm_id, duplicates + len(pending), rejected, acked)
+            if not pending:
+                return _backlog_duplicates(farm_id, duplicates, rejected, acked)
+            return jsonify({
+                "error": "No active batch. Create a batch first.",
+                "farm_id": farm_id
+            }), 400
+
+        inserted = []
+        accepted_keys = set()
+        flagged = quarantined = 0
+
+        if pending:
+            # Device order, so created_at (and the Merkle leaf order) follows seq
+            pending.sort(key=lambda p: p[0]["seq"])
+
+            scored = pending
+            all_findings = inspect_many(data["device_id"], [reading for _, reading, _ in scored])
+
+            kept, rows = [], []
+            for (item, reading, key), findings in zip(scored, all_findings):
+                flagged += bool(findings)
+                if should_quarantine(findings):
+                    _quarantine(active_batch_id, item, reading, findings)
+                    recent.add(key)
+                    accepted_keys.add(key)
+                    quarantined += 1
+                    continue
+                kept.append((item, reading, key))
+                rows.append(_harvest_row(active_batch_id, reading, item, key, findings))
+
+            pending = kept
+
+        if pending:
+            stored = _store_routed(rows)
+            active_batch_id = rows[0]["batch_id"]
+            inserted_keys = None if stored is None else {row["idempotency_key"] for row in stored}
+
+            for item, reading, key in pending:
+                recent.add(key)
+                if inserted_keys is None or key in inserted_keys:
+                    inserted.append(reading)
+                    accepted_keys.add(key)
+                else:
+                    duplicates += 1
+
+            if inserted_keys is not None and inserted:
+                _after_insert(active_batch_id, inserted)
+
+        if accepted_keys:
+            # Learn in seq order, duplicates left out
+            observe_readings(data["device_id"], [
+                reading for _, reading, key in scored if key in accepted_keys
+            ])
+
+        if inserted:
+            hub.publish(active_batch_id, _latest_payload(
+                active_batch_id, inserted[-1], "PENDING", "PENDING", "sepolia"
+            ))
+
+        mark_duplicate(duplicates)
+        print("✅ Backlog stored under batch:", active_batch_id,
+              "accepted:", len(inserted), "duplicates:", duplicates)
+
+        return jsonify({
+            "message": "Backlog received",
+            "active_batch": active_batch_id,
+            "farm_id": farm_id,
+            "accepted": len(inserted),
+            "duplicates": duplicates,
+            "flagged": flagged,
+            "quarantined": quarantined,
+            "rejected": rejected,
+            "acked_seq": max(acked) if acked else None
+        }), 200
+
+    except Exception as e:
+        if batch_closed(e):
+            if _all_stored([key for _, _, key in pending]):
+                return _backlog_duplicates(farm_id, duplicates + len(pending), rejected, acked)
+            return jsonify({
+                "error": "Batch was finalized and there is no active batch. Create a batch first.",
+                "details": str(e)
+            }), 409
+        return jsonify({
+            "error": "Failed to process backlog",
+            "details": str(e)
+        }), 500
+
+
 # =========================================================
 # GET: Latest sensor data (ACTIVE batch)
-# GET /api/sensors/latest
+# GET /api/sensors/latest[?batch_id=<batch_id>]
+# Served from the live cache when this process has seen a
+# reading; falls back to the database otherwise.
 # =========================================================
 @sensors_bp.route("/latest", methods=["GET"])
 def get_latest_sensor():
+    batch_id = request.args.get("batch_id")
+
+    cached = hub.latest(batch_id or ALL_TOPIC)
+    if cached:
+        return jsonify(cached), 200
+
     try:
-        response = supabase.table("harvest_data") \
-            .select("*") \
+        query = supabase.table("harvest_data").select("*")
+        if batch_id:
+            query = query.eq("batch_id", batch_id)
+
+        response = query \
             .order("created_at", desc=True) \
             .limit(1) \
             .execute()
@@ -96,20 +477,15 @@ def get_latest_sensor():
             return jsonify({"error": "No sensor data available"}), 404
 
         row = response.data[0]
-        sensor = row["sensor_data"]
 
-        return jsonify({
-            "batch_id": row["batch_id"],
-            "airTemp": sensor.get("airTemp"),
-            "humidity": sensor.get("humidity"),
-            "soilMoisture": sensor.get("soilMoisture"),
-            "soilPH": sensor.get("soilPH"),
-            "npk": sensor.get("npk"),
-            "timestamp": sensor.get("timestamp"),
-            "merkle_root": row["merkle_root"],
-            "blockchain_tx": row["blockchain_tx"],
-            "network": row.get("network")
-        }), 200
+        return jsonify(_latest_payload(
+            row["batch_id"],
+            row["sensor_data"],
+            row["merkle_root"],
+            row["blockchain_tx"],
+            row.get("network"),
+            row.get("anomalies")
+        )), 200
 
     except Exception as e:
         return jsonify({
@@ -118,6 +494,48 @@ def get_latest_sensor():
         }), 500
 
 
+# =========================================================
+# GET: Live sensor stream (Server-Sent Events)
+# GET /api/sensors/stream             (all batches)
+# GET /api/sensors/stream/<batch_id>  (one batch)
+# Resume with the Last-Event-ID header (or ?lastEventId=)
+# =========================================================
+@sensors_bp.route("/stream", methods=["GET"])
+@sensors_bp.route("/stream/<batch_id>", methods=["GET"])
+def stream_sensor_data(batch_id=ALL_TOPIC):
+    last_event_id = request.headers.get("Last-Event-ID") \
+        or request.args.get("lastEventId")
+
+    # Topics only for real batches, not any id a client makes up
+    if batch_id != ALL_TOPIC:
+        try:
+            exists = supabase.table("batches") \
+                .select("batch_id") \
+                .eq("batch_id", batch_id) \
+                .limit(1) \
+                .execute()
+        except Exception as e:
+            return jsonify({
+                "error": "Failed to open live stream",
+                "details": str(e)
+            }), 500
+
+        if not exists.data:
+            return jsonify({"error": "Batch not found"}), 404
+
+    try:
+        frames = hub.stream(batch_id, last_event_id)
+    except ValueError:
+        return jsonify({"error": "Invalid Last-Event-ID"}), 400
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 503
+
+    return Response(frames, mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+
 # =========================================================
 # GET: Sensor data for a specific batch (VIEW MODE)
 # GET /api/sensors/batch/<batch_id>
@@ -138,3 +556,79 @@ def get_sensor_data_by_batch(batch_id):
             "error": "Failed to fetch batch sensor data",
             "details": str(e)
         }), 500
+
+
+# =========================================================
+# GET: Running summary statistics for a batch (O(1))
+# GET /api/sensors/batch/<batch_id>/summary
+# =========================================================
+@sensors_bp.route("/batch/<batch_id>/summary", methods=["GET"])
+def get_batch_summary(batch_id):
+    try:
+        summary = get_summary(batch_id)
+
+        if not summary["reading_count"]:
+            return jsonify({"error": "No summary available for batch"}), 404
+
+        return jsonify(summary), 200
+
+    except Exception as e:
+        return jsonify({
+            "error": "Failed to fetch batch summary",
+            "details": str(e)
+        }), 500
+
+
+# =========================================================
+# GET: Time-bucketed rollups for charts
+# GET /api/sensors/batch/<batch_id>/rollup
+#     ?resolution=minute|hour|day&start=<iso>&end=<iso>
+# =========================================================
+@sensors_bp.route("/batch/<batch_id>/rollup", methods=["GET"])
+def get_batch_rollup(batch_id):
+    try:
+        return jsonify(get_rollups(
+            batch_id,
+            resolution=request.args.get("resolution", "hour"),
+            start=request.args.get("start"),
+            end=request.args.get("end")
+        )), 200
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    except Exception as e:
+        return jsonify({
+            "error": "Failed to fetch batch rollup",
+            "details": str(e)
+        }), 500
+
+
+# =========================================================
+# GET: LTTB-downsampled raw series for one metric
+# GET /api/sensors/batch/<batch_id>/downsample
+#     ?metric=airTemp&points=500&start=<iso>&end=<iso>
+# =========================================================
+@sensors_bp.route("/batch/<batch_id>/downsample", methods=["GET"])
+def get_batch_downsample(batch_id):
+    metric = request.args.get("metric")
+    if not metric:
+        return jsonify({"error": "metric is required"}), 400
+
+    try:
+        return jsonify(downsample_raw(
+            batch_id,
+            metric,
+            points=request.args.get("points", 500),
+            start=request.args.get("start"),
+            end=request.args.get("end")
+        )), 200
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    except Exception as e:
+        return jsonify({
+            "error": "Failed to downsample batch data",
+            "details": str(e)
+        }), 500
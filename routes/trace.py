@@ -1,11 +1,15 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request
 from supabase import create_client
 from web3 import Web3
 import json
 import os
 
-from routes.hash_readings import hash_reading
-from routes.merkle_tree import merkle_root
+from routes.merkle_tree import leaves_and_root
+from routes.offload import offload
+from routes.batch_archive import is_archived, load_readings
+from routes.metrics import instrument_supabase, instrument_web3, MERKLE_LATENCY, size_bucket
+from routes.paging import fetch_all, readings_of
+from routes import verify_cache, http_cache
 
 # ---------------------------------
 # Blueprint
@@ -17,7 +21,7 @@ trace_bp = Blueprint("trace", __name__)
 # ---------------------------------
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+supabase = instrument_supabase(create_client(SUPABASE_URL, SUPABASE_KEY))
 
 # ---------------------------------
 # Blockchain Configuration (READ ONLY)
@@ -25,7 +29,7 @@ supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
 SEPOLIA_RPC_URL = "https://sepolia.infura.io/v3/YOUR_API_KEY"
 CONTRACT_ADDRESS = "0xb8E82a2247b1E6a358220C8C24Ba53e89b411138"
 
-w3 = Web3(Web3.HTTPProvider(SEPOLIA_RPC_URL))
+w3 = instrument_web3(Web3(Web3.HTTPProvider(SEPOLIA_RPC_URL)))
 
 with open("abi.json") as f:
     abi = json.load(f)
@@ -35,6 +39,54 @@ contract = w3.eth.contract(
     abi=abi
 )
 
+# -------------------------------------------------
+# HELPER: Recompute Merkle root from readings
+# -------------------------------------------------
+def _database_readings(batch_id):
+    rows = fetch_all(lambda: supabase.table("harvest_data")
+                     .select("sensor_data")
+                     .eq("batch_id", batch_id)
+                     .order("created_at", desc=False))
+
+    return list(readings_of(rows))
+
+
+def _root_of(readings):
+    with MERKLE_LATENCY.time(size=size_bucket(len(readings))):
+        return offload(leaves_and_root, readings)[1]
+
+
+def _verify_readings(batch_id, stored_root):
+    # =================================
+    # 3️⃣ Leaves are always re-hashed from the readings themselves.
+    #    Archived batches are read from the archive only (one gzip
+    #    file, no harvest_data scan)
+    # =================================
+    if is_archived(batch_id):
+        source = "archive"
+        try:
+            recomputed_root = _root_of(load_readings(batch_id))
+        except (ValueError, OSError):
+            # Checksum mismatch / unreadable file: the archive was altered
+            recomputed_root = ""
+    else:
+        readings = _database_readings(batch_id)
+        if not readings:
+            return None
+        source = "database"
+        recomputed_root = _root_of(readings)
+
+    # =================================
+    # 4️⃣ Tamper verification
+    # =================================
+    return {
+        "verified": recomputed_root == stored_root,
+        "recomputed_root": recomputed_root,
+        "readings_source": source,
+        "blockchain_verified": False
+    }
+
+
 # -------------------------------------------------
 # GET: Trace & Verify product using Batch ID (QR)
 # -------------------------------------------------
@@ -42,8 +94,17 @@ contract = w3.eth.contract(
 def trace_product(batch_id):
     """
     QR → Batch trace & tamper verification
+    ?reverify=1 bypasses the verification cache (audits)
     """
 
+    reverify = request.args.get("reverify") in ("1", "true")
+
+    # Conditional GET: 304 before touching the database
+    if not reverify:
+        response = http_cache.precheck(("trace", batch_id))
+        if response is not None:
+            return response
+
     try:
         # =================================
         # 1️⃣ Fetch finalized batch metadata
@@ -70,52 +131,51 @@ def trace_product(batch_id):
         blockchain_tx = batch_res.data["blockchain_tx"]
 
         # =================================
-        # 2️⃣ Fetch ALL sensor readings (ORDERED)
+        # 2️⃣ Verification cache (finalized = immutable)
+        #    ?reverify=1 forces a full audit
         # =================================
-        readings_res = supabase.table("harvest_data") \
-            .select("sensor_data") \
-            .eq("batch_id", batch_id) \
-            .order("created_at", desc=False) \
-            .execute()
+        fp = verify_cache.fingerprint(stored_root, blockchain_tx)
 
-        readings = []
+        result = None if reverify else verify_cache.get(batch_id, fp)
+        cached = result is not None
 
-        for row in readings_res.data:
-            if isinstance(row["sensor_data"], list):
-                readings.extend(row["sensor_data"])
-            else:
-                readings.append(row["sensor_data"])
+        if cached:
+            # The cached dict is shared by every request; never mutate it
+            result = dict(result)
 
-        if not readings:
-            return jsonify({
-                "verified": False,
-                "error": "No sensor readings found"
-            }), 404
+        if result is None:
+            result = _verify_readings(batch_id, stored_root)
 
-        # =================================
-        # 3️⃣ Recompute Merkle root
-        # =================================
-        hashes = [hash_reading(r) for r in readings]
-        recomputed_root = merkle_root(hashes)
-
-        # =================================
-        # 4️⃣ Tamper verification
-        # =================================
-        verified = (recomputed_root == stored_root)
+            if result is None:
+                return jsonify({
+                    "verified": False,
+                    "error": "No sensor readings found"
+                }), 404
 
         # =================================
         # 5️⃣ Optional blockchain existence check
         # =================================
-        try:
-            total_batches = contract.functions.getTotalBatches().call()
-            blockchain_verified = total_batches > 0
-        except Exception:
-            blockchain_verified = False
+        if not result["blockchain_verified"]:
+            try:
+                total_batches = contract.functions.getTotalBatches().call()
+                result["blockchain_verified"] = total_batches > 0
+            except Exception:
+                result["blockchain_verified"] = False
+
+            # Store new results, or a cached one now confirmed on chain
+            if not cached or result["blockchain_verified"]:
+                verify_cache.put(batch_id, fp, result)
+
+        verified = result["verified"]
+        recomputed_root = result["recomputed_root"]
+        blockchain_verified = result["blockchain_verified"]
+        readings_source = result["readings_source"]
 
         # =================================
-        # 6️⃣ Final trace response
+        # 6️⃣ Final trace response (ETag-validated; immutable only
+        #    once verified and on chain)
         # =================================
-        return jsonify({
+        payload = {
             "batchId": batch_id,
             "verified": verified,
             "tamperStatus": "NOT TAMPERED" if verified else "TAMPERED",
@@ -125,6 +185,7 @@ def trace_product(batch_id):
 
             "blockchainTx": blockchain_tx,
             "blockchainVerified": blockchain_verified,
+            "readingsSource": readings_source,
 
             "supplyChain": [
                 "Harvested at Farm",
@@ -133,7 +194,19 @@ def trace_product(batch_id):
                 "Stored on Ethereum Sepolia",
                 "Verified via QR Scan"
             ]
-        }), 200
+        }
+
+        etag = http_cache.strong_etag(
+            stored_root, blockchain_tx, recomputed_root,
+            verified, blockchain_verified, readings_source
+        )
+
+        response = http_cache.immutable_json(
+            ("trace", batch_id), payload, etag,
+            immutable=verified and blockchain_verified
+        )
+        response.headers["X-Verify-Cache"] = "HIT" if cached else "MISS"
+        return response
 
     except Exception as e:
         return jsonify({
@@ -0,0 +1,74 @@
+"""
+Verification result cache for FINALIZED batches.
+
+A finalized batch can never change, so once its readings have been
+re-hashed and checked against the stored Merkle root the result is kept,
+keyed by batch_id + fingerprint (stored root and tx hash). A different
+fingerprint (e.g. re-anchored batch) simply misses.
+
+Two tiers: an in-memory LRU per process, and JSON files under
+VERIFY_CACHE_DIR shared by every worker and surviving restarts.
+"""
+
+from collections import OrderedDict
+import threading
+import hashlib
+import json
+import os
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+VERIFY_CACHE_DIR = os.getenv("VERIFY_CACHE_DIR", os.path.join(BASE_DIR, "cache", "verify"))
+VERIFY_CACHE_SIZE = int(os.getenv("VERIFY_CACHE_SIZE", "10000"))
+
+_memory = OrderedDict()
+_lock = threading.Lock()
+
+
+def fingerprint(merkle_root: str, tx_hash: str) -> str:
+    return f"{(merkle_root or '').lower()}:{(tx_hash or '').lower()}"
+
+
+def _path(batch_id: str, fp: str) -> str:
+    name = hashlib.sha256(f"{batch_id}|{fp}".encode()).hexdigest()
+    return os.path.join(VERIFY_CACHE_DIR, name + ".json")
+
+
+def _remember(key, result):
+    with _lock:
+        _memory[key] = result
+        _memory.move_to_end(key)
+        while len(_memory) > VERIFY_CACHE_SIZE:
+            _memory.popitem(last=False)
+
+
+def get(batch_id: str, fp: str):
+    key = (batch_id, fp)
+
+    with _lock:
+        result = _memory.get(key)
+        if result is not None:
+            _memory.move_to_end(key)
+            return result
+
+    try:
+        with open(_path(batch_id, fp)) as f:
+            result = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    _remember(key, result)
+    return result
+
+
+def put(batch_id: str, fp: str, result: dict) -> None:
+    _remember((batch_id, fp), result)
+
+    try:
+        os.makedirs(VERIFY_CACHE_DIR, exist_ok=True)
+        path = _path(batch_id, fp)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(result, f)
+        os.replace(tmp, path)
+    except OSError as e:
+        print("⚠️ Verify cache write failed:", e)